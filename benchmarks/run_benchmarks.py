@@ -0,0 +1,243 @@
+"""
+Benchmarks round generation, stats, brackets and session load/save on synthetic tournaments.
+
+    python benchmarks/run_benchmarks.py                                  # default sizes
+    python benchmarks/run_benchmarks.py --players 32 2000 20000 --rounds 15
+    python benchmarks/run_benchmarks.py --output new.json --compare old.json
+    python benchmarks/run_benchmarks.py --verify --players 32 256 --rounds 8
+
+With --verify nothing is timed, instead every round's matching is done with all
+the matching backends, which have to agree on the total weight.
+
+Tournaments are played out round by round with the real pairing, with random results,
+some delayed and unplayed matches, and players dropping, so odd fields and BYEs show up too.
+Everything is seeded, so the same arguments give the same tournaments on every version.
+Results are written as JSON, one entry per timed operation.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from classes import *
+from instrumentation import PairingMetrics
+from pairing import (MATCHING_BACKEND_NAMES, PairingSettings, apply_byes, assign_integer_scores,
+                     calculate_players_stats, create_bracket, find_optimal_matching, generate_matchups,
+                     get_scores_for_round_generation, get_total_weight)
+from session import read_session_file, session_from_dict, session_to_dict, write_session_file
+from stats import StatsEngine
+
+
+def measure(function, memory: bool) -> tuple[float, int | None, object]:
+    """
+    Times a call (with its prints silenced), and if `memory` is set calls it
+    a second time under tracemalloc for the peak memory, as tracing slows it down.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        peak = None
+        if memory:
+            tracemalloc.start()
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return seconds, peak, result
+
+
+def play_round(round: Round, rng: random.Random, delay_rate: float, no_winner_rate: float):
+    for matchup in round.matchups:
+        if not matchup.player2:
+            continue
+        roll = rng.random()
+        if roll < delay_rate:
+            matchup.winner = "Delayed"
+        elif roll < delay_rate + no_winner_rate:
+            matchup.winner = "No Winner"
+        elif rng.random() < 0.5:
+            matchup.winner = matchup.player1
+            matchup.score_player1 = 1.0
+        else:
+            matchup.winner = matchup.player2
+            matchup.score_player2 = 1.0
+
+
+def run_tournament(n_players: int, n_rounds: int, args) -> list[dict]:
+    rng = random.Random(f"{args.seed}-{n_players}-{n_rounds}")
+    settings = PairingSettings({"matching_backend": args.matching_backend, "pairing_window": args.pairing_window,
+                                "pairing_block_size": args.block_size})
+    players = [Player(f"Player {i}") for i in range(n_players)]
+    rounds: list[Round] = []
+    results = []
+
+    def record(operation: str, seconds: float, peak: int | None, **extra):
+        results.append({"players": n_players, "rounds": n_rounds, "operation": operation,
+                        "seconds": seconds, "peak_memory_bytes": peak, **extra})
+        print(f"{n_players:>6} players {n_rounds:>2} rounds  {operation:<24} "
+              f"{seconds:8.3f}s" + (f"  {peak / 2**20:8.1f} MiB" if peak is not None else "")
+              + (f"  (round {extra['round']})" if "round" in extra else ""))
+
+    for round_number in range(1, n_rounds + 1):
+        for player in players:
+            if not player.dropped and rng.random() < args.drop_rate:
+                player.dropped = True
+        def generate():
+            metrics = PairingMetrics()
+            return generate_matchups(players, rounds, settings, metrics=metrics), metrics
+        seconds, peak, (matchups, metrics) = measure(generate, args.memory)
+        record("generate_matchups", seconds, peak, round=round_number, spans=metrics.spans, counters=metrics.counters)
+        new_round = apply_byes(matchups)
+        play_round(new_round, rng, args.delay_rate, args.no_winner_rate)
+        rounds.append(new_round)
+
+    seconds, peak, player_info_list = measure(lambda: calculate_players_stats(players, rounds), args.memory)
+    record("calculate_players_stats", seconds, peak)
+    seconds, peak, _ = measure(lambda: StatsEngine(players, rounds).get_stats(), args.memory)
+    record("stats_engine_cold", seconds, peak)
+
+    bracket_size = 2 ** min(6, max(1, (n_players - 1).bit_length() - 1))
+    top_players = sorted(player_info_list, key=lambda p: (p.score, p.resistance), reverse=True)[:bracket_size]
+    seconds, peak, _ = measure(lambda: create_bracket(top_players), args.memory)
+    record("create_bracket", seconds, peak, bracket_size=bracket_size)
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "session.json")
+        seconds, peak, _ = measure(lambda: write_session_file(file_name, session_to_dict(players, rounds, settings.to_dict())), args.memory)
+        record("session_save", seconds, peak, file_bytes=os.path.getsize(file_name))
+        seconds, peak, _ = measure(lambda: session_from_dict(read_session_file(file_name)), args.memory)
+        record("session_load", seconds, peak)
+        file_name = os.path.join(directory, "session.swiss")
+        seconds, peak, _ = measure(lambda: write_session_file(file_name, session_to_dict(players, rounds, settings.to_dict())), args.memory)
+        record("session_save_binary", seconds, peak, file_bytes=os.path.getsize(file_name))
+        seconds, peak, _ = measure(lambda: session_from_dict(read_session_file(file_name)), args.memory)
+        record("session_load_binary", seconds, peak)
+    return results
+
+
+def verify_backends(n_players: int, n_rounds: int, args) -> int:
+    """
+    Plays a tournament like `run_tournament`, matching every round with each backend
+    as well. Prints and returns the number of rounds where the backends disagree on
+    the total weight or a backend doesn't pair every player once.
+    """
+    rng = random.Random(f"{args.seed}-{n_players}-{n_rounds}")
+    settings = PairingSettings({"matching_backend": args.matching_backend, "pairing_window": args.pairing_window,
+                                "pairing_block_size": args.block_size})
+    players = [Player(f"Player {i}") for i in range(n_players)]
+    rounds: list[Round] = []
+    mismatches = 0
+
+    for round_number in range(1, n_rounds + 1):
+        for player in players:
+            if not player.dropped and rng.random() < args.drop_rate:
+                player.dropped = True
+        player_info_list_in_round = [p for p in calculate_players_stats(players, rounds) if not p.player.dropped]
+        integer_scores = assign_integer_scores(get_scores_for_round_generation(player_info_list_in_round, rounds,
+                                                                               settings, random.Random(round_number)))
+        history = OpponentHistory(rounds)
+        weights = {}
+        for backend in MATCHING_BACKEND_NAMES:
+            with contextlib.redirect_stdout(io.StringIO()):
+                matching = find_optimal_matching(player_info_list_in_round, integer_scores, history,
+                                                 args.pairing_window, backend)
+            paired = [p for pair in matching for p in pair if p != "BYE"]
+            valid = sorted(p.player.name for p in paired) == sorted(p.player.name for p in player_info_list_in_round)
+            weights[backend] = get_total_weight(matching, integer_scores, history) if valid else None
+        agree = None not in weights.values() and len(set(weights.values())) == 1
+        mismatches += not agree
+        print(f"{n_players:>6} players {n_rounds:>2} rounds  round {round_number:>2}  "
+              + "  ".join(f"{backend}: {weight}" for backend, weight in weights.items())
+              + ("" if agree else "  MISMATCH"))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            new_round = apply_byes(generate_matchups(players, rounds, settings))
+        play_round(new_round, rng, args.delay_rate, args.no_winner_rate)
+        rounds.append(new_round)
+    return mismatches
+
+
+def get_version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(results: list[dict], old_file: str):
+    """
+    Prints how much slower (>1) or faster (<1) every operation got compared to an older run.
+    """
+    with open(old_file, "r", encoding="utf-8") as f:
+        old = json.load(f)
+
+    def key(entry):
+        return (entry["players"], entry["rounds"], entry["operation"], entry.get("round"))
+    old_results = {key(entry): entry for entry in old["results"]}
+    print(f"\nCompared to {old_file} ({old.get('version', 'unknown version')}):")
+    for entry in results:
+        previous = old_results.get(key(entry))
+        if previous and previous["seconds"]:
+            ratio = entry["seconds"] / previous["seconds"]
+            print(f"{entry['players']:>6} players {entry['rounds']:>2} rounds  {entry['operation']:<24} "
+                  f"{ratio:6.2f}x" + (f"  (round {entry['round']})" if entry.get("round") else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark round generation and stats on synthetic tournaments.")
+    parser.add_argument("--players", type=int, nargs="+", default=[32, 256, 2000])
+    parser.add_argument("--rounds", type=int, nargs="+", default=[1, 5, 15])
+    parser.add_argument("--seed", default="0")
+    parser.add_argument("--drop-rate", type=float, default=0.01, help="chance a player drops before each round")
+    parser.add_argument("--delay-rate", type=float, default=0.02, help="chance a match is delayed")
+    parser.add_argument("--no-winner-rate", type=float, default=0.01, help="chance a match has no winner")
+    parser.add_argument("--matching-backend", default="networkx")
+    parser.add_argument("--pairing-window", type=int, default=2)
+    parser.add_argument("--block-size", type=int, default=0, help="score block size, 0 for one block")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip measuring peak memory")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--verify", action="store_true",
+                        help="check that all matching backends find pairings of the same weight, instead of timing")
+    args = parser.parse_args()
+    if args.pairing_window < 1:
+        parser.error("--pairing-window must be at least 1")
+
+    if args.verify:
+        mismatches = sum(verify_backends(n_players, n_rounds, args) for n_players in args.players for n_rounds in args.rounds)
+        print(f"{mismatches} rounds where the backends disagree")
+        sys.exit(1 if mismatches else 0)
+
+    results = []
+    for n_players in args.players:
+        for n_rounds in args.rounds:
+            results += run_tournament(n_players, n_rounds, args)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": get_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "arguments": vars(args),
+            "results": results,
+        }, f, indent=4)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+from PySide6.QtCore import QObject, Signal
+import collections
+import threading
+import time
+import traceback
+from session import replace_session_file
+
+
+class AutosaveWriter(QObject):
+    """
+    Writes sessions in a background thread, so saving never holds up the window.
+    Only the newest pending save is kept: if several come in while a file is being
+    written, the ones in between are skipped.
+    Files are replaced atomically, see `replace_session_file`.
+    """
+    # file name, the token passed to `save`, seconds the write took
+    saved = Signal(str, object, float)
+    # file name, error message
+    failed = Signal(str, str)
+
+    def __init__(self, n_latencies: int = 100):
+        super().__init__()
+        self.condition = threading.Condition()
+        self.pending: tuple[str, dict, object] | None = None
+        self.writing = False
+        # seconds per write, the latest ones
+        self.latencies = collections.deque(maxlen=n_latencies)
+        self.n_skipped = 0
+        self.thread = threading.Thread(target=self.run, name="autosave", daemon=True)
+        self.thread.start()
+
+    def save(self, file_name: str, data: dict, token=None):
+        """
+        Queues `data` (see `session_to_dict`) to be written to `file_name`. The data
+        must not be changed afterwards, take a fresh dict for every save.
+        """
+        with self.condition:
+            if self.pending is not None:
+                self.n_skipped += 1
+            self.pending = (file_name, data, token)
+            self.condition.notify()
+
+    @property
+    def busy(self) -> bool:
+        with self.condition:
+            return self.writing or self.pending is not None
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Waits until everything queued is written, returns False on timeout.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.writing and self.pending is None, timeout)
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending is not None)
+                file_name, data, token = self.pending
+                self.pending = None
+                self.writing = True
+            try:
+                start = time.perf_counter()
+                replace_session_file(file_name, data)
+                seconds = time.perf_counter() - start
+                self.latencies.append(seconds)
+                self.saved.emit(file_name, token, seconds)
+            except Exception as e:
+                traceback.print_exc()
+                self.failed.emit(file_name, str(e))
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+    def latency_stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return {"count": 0}
+        return {
+            "count": len(latencies),
+            "skipped": self.n_skipped,
+            "mean_ms": sum(latencies) / len(latencies) * 1000,
+            "p50_ms": latencies[len(latencies) // 2] * 1000,
+            "max_ms": latencies[-1] * 1000,
+        }
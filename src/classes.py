@@ -1,6 +1,12 @@
 import re
+from collections import defaultdict
+
+# the classes below are created by the hundreds of thousands for big events,
+# so they use __slots__ to keep them small and quick to read
 
 class Player():
+    __slots__ = ("name", "dropped")
+
     def __init__(self, name: str, dropped = False):
         self.name = name
         self.dropped = dropped
@@ -13,6 +19,8 @@ class Player():
 
 
 class PlayerInfo():
+    __slots__ = ("player", "score", "resistance", "n_played", "n_wins", "active_delays", "mispairings")
+
     def __init__(self, player: Player):
         self.player = player
         self.score = 0.0
@@ -30,6 +38,8 @@ class PlayerInfo():
 
 
 class Matchup():
+    __slots__ = ("player1", "player2", "winner", "score_player1", "score_player2", "notes")
+
     def __init__(self, player1: str, player2: str, notes: str = ""):
         self.player1 = player1
         self.player2 = player2
@@ -56,6 +66,8 @@ class Matchup():
 
 
 class Round():
+    __slots__ = ("matchups",)
+
     def __init__(self, matchups: list[Matchup]):
         self.matchups = matchups
 
@@ -69,3 +81,66 @@ class Round():
         return {
             "matchups": [m.to_dict() for m in self.matchups]
         }
+
+
+class OpponentHistory():
+    """
+    Index of who played who over all rounds, so it doesn't have to be rebuilt
+    from every matchup for every pairing, stats calculation or check.
+    Kept up to date by adding rounds as they are created and passing
+    on result changes.
+
+    Also works as the set of `(player1, player2)` tuples it replaces:
+    `(name, other) in history` for rematches, `(None, name) in history` for BYEs.
+    """
+    __slots__ = ("opponents", "byes", "delays_per_round")
+
+    def __init__(self, rounds: list[Round] | None = None):
+        # opponent name -> number of times played, as rematches can happen
+        self.opponents: dict[str, dict[str, int]] = defaultdict(dict)
+        self.byes: set[str] = set()
+        self.delays_per_round: list[int] = []
+        for round in rounds or []:
+            self.add_round(round)
+
+    def __str__(self):
+        return f"History of {len(self.delays_per_round)} rounds."
+
+    def __repr__(self):
+        return f"History of {len(self.delays_per_round)} rounds."
+
+    def __contains__(self, pair: tuple[str | None, str | None]) -> bool:
+        player1, player2 = pair
+        if player1 is None or player2 is None:
+            return (player1 or player2) in self.byes
+        return player2 in self.opponents.get(player1, ())
+
+    def __iter__(self):
+        for player, opponents in self.opponents.items():
+            for opponent in opponents:
+                yield (player, opponent)
+        for player in self.byes:
+            yield (None, player)
+            yield (player, None)
+
+    def add_round(self, round: Round):
+        delays = 0
+        for matchup in round.matchups:
+            if matchup.player2:
+                opponents1 = self.opponents[matchup.player1]
+                opponents2 = self.opponents[matchup.player2]
+                opponents1[matchup.player2] = opponents1.get(matchup.player2, 0) + 1
+                opponents2[matchup.player1] = opponents2.get(matchup.player1, 0) + 1
+            else:
+                self.byes.add(matchup.player1)
+            delays += matchup.winner == "Delayed"
+        self.delays_per_round.append(delays)
+
+    def update_result(self, round_index: int, old_winner: str, new_winner: str):
+        self.delays_per_round[round_index] += (new_winner == "Delayed") - (old_winner == "Delayed")
+
+    def has_played(self, player1: str, player2: str) -> bool:
+        return player2 in self.opponents.get(player1, ())
+
+    def had_bye(self, player: str) -> bool:
+        return player in self.byes
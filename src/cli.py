@@ -0,0 +1,102 @@
+"""
+Generate the next round of a saved session without the GUI.
+
+    python cli.py tournament.json                     # adds the round to the file
+    python cli.py tournament.json -o next.json        # writes to another file
+    python cli.py tournament.json -o next.swiss       # in the compact binary format
+    python cli.py tournament.json --timings           # also shows how long each step took
+    python cli.py tournament.json --seeds 8           # tries 8 seeds on all cores and keeps the best
+    python cli.py tournament.json --deadline 10       # the best pairing found within 10 seconds
+"""
+import time
+start = time.perf_counter()
+
+import argparse
+import sys
+from instrumentation import PairingMetrics
+from pairing import MATCHING_BACKEND_NAMES, PairingSettings, apply_byes, generate_matchups
+from session import SessionError, read_session_file, session_from_dict, session_to_dict, write_session_file
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate the next Swiss round for a saved session.")
+    parser.add_argument("session", help="session file (JSON or binary .swiss), as exported from the app")
+    parser.add_argument("-o", "--output", help="where to write the session with the new round (default: overwrite the input), "
+                                               "binary if it ends in .swiss")
+    parser.add_argument("--matching-backend", choices=MATCHING_BACKEND_NAMES,
+                        help="matching algorithm to use, overrides the saved setting")
+    parser.add_argument("--pairing-window", type=int, help="score group window, overrides the saved setting")
+    parser.add_argument("--seeds", type=int, help="number of seeds to pair with in parallel, keeping the best, overrides the saved setting")
+    parser.add_argument("--deadline", type=float, help="seconds the pairing may take, after which the best pairing found so far is used")
+    parser.add_argument("--block-size", type=int, help="players per score block matched in parallel (0 for one block), overrides the saved setting")
+    parser.add_argument("--timings", action="store_true", help="print how long startup, loading, pairing and saving took")
+    parser.add_argument("--profile", action="store_true", help="profile the round generation (cProfile and tracemalloc)")
+    args = parser.parse_args(argv)
+    if args.pairing_window is not None and args.pairing_window < 1:
+        parser.error("--pairing-window must be at least 1")
+    timings = {"startup": time.perf_counter() - start}
+
+    step = time.perf_counter()
+    load_metrics = PairingMetrics()
+    with load_metrics.span("parse"):
+        data = read_session_file(args.session)
+    try:
+        players, rounds, saved_settings = session_from_dict(data, load_metrics)
+    except SessionError as e:
+        print(e, file=sys.stderr)
+        return 1
+    settings = PairingSettings(saved_settings)
+    if args.matching_backend:
+        settings.matching_backend = args.matching_backend
+    if args.pairing_window is not None:
+        settings.pairing_window = args.pairing_window
+    if args.seeds:
+        settings.pairing_seeds = args.seeds
+    if args.deadline:
+        settings.pairing_deadline = args.deadline
+    if args.block_size is not None:
+        settings.pairing_block_size = args.block_size
+    timings["load"] = time.perf_counter() - step
+
+    unfinished = [m for m in rounds[-1].matchups if not m.winner] if rounds else []
+    if unfinished:
+        print(f"Round {len(rounds)} has {len(unfinished)} matchups without a winner, "
+              f"for example {unfinished[0]}. Set \"No Winner\" or \"Delayed\" first.", file=sys.stderr)
+        return 1
+
+    # the first call also imports numpy and friends
+    step = time.perf_counter()
+    profile = args.profile or settings.profile_pairing
+    metrics = PairingMetrics(profile=profile, trace_memory=profile)
+    new_round = apply_byes(generate_matchups(players, rounds, settings, metrics=metrics))
+    rounds.append(new_round)
+    pairing_metrics = data.get("pairing_metrics", []) + [{"round": len(rounds), **metrics.to_dict()}]
+    timings["pairing"] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    # keep settings only the GUI knows about, like the clipboard format
+    write_session_file(args.output or args.session, session_to_dict(players, rounds, {**saved_settings, **settings.to_dict()},
+                                                                    pairing_metrics))
+    timings["save"] = time.perf_counter() - step
+
+    if metrics.counters["deadline_reached"]:
+        quality = "deadline reached, not proven optimal"
+    elif not metrics.counters["optimal"]:
+        quality = "matched within the score group window or blocks, not proven optimal"
+    else:
+        quality = "optimal"
+    print(f"Round {len(rounds)} (cost {metrics.counters['cost']}, {quality}):")
+    for matchup in new_round.matchups:
+        print(matchup)
+    if args.timings:
+        for name, seconds in timings.items():
+            print(f"{name}: {seconds:.3f} seconds")
+        print(f"loading steps: {load_metrics}")
+        print(f"pairing steps: {metrics}")
+    if metrics.profile_text:
+        print(metrics.profile_text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
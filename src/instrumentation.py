@@ -0,0 +1,88 @@
+"""
+Timings and counters for round generation, so slow rounds can be looked into afterwards.
+"""
+from contextlib import contextmanager
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+
+
+class PairingMetrics():
+    """
+    Named spans (seconds, added up if a span runs more than once) and counters
+    of one round generation. Pass one to `generate_matchups` and read it afterwards,
+    or save `to_dict()` with the session.
+
+    With `profile` the whole generation runs under cProfile and the top functions
+    are kept, with `trace_memory` the peak memory is measured with tracemalloc.
+    Both slow things down, so they're off by default.
+    """
+    def __init__(self, profile: bool = False, trace_memory: bool = False):
+        self.spans: dict[str, float] = {}
+        self.counters: dict[str, int | float | str] = {}
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profile_text: str | None = None
+        self.peak_memory: int | None = None
+
+    def __str__(self):
+        spans = ", ".join(f"{name}: {seconds:.3f}s" for name, seconds in self.spans.items())
+        counters = ", ".join(f"{name}: {value}" for name, value in self.counters.items())
+        return f"{spans} ({counters})"
+
+    def __repr__(self):
+        return str(self)
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name] = self.spans.get(name, 0.) + time.perf_counter() - start
+
+    def count(self, name: str, value: int | float | str = 1, add: bool = False):
+        if add:
+            self.counters[name] = self.counters.get(name, 0) + value
+        else:
+            self.counters[name] = value
+
+    @contextmanager
+    def capture(self):
+        """
+        Wraps a whole round generation, timing it and running the opt-in profilers.
+        """
+        profiler = cProfile.Profile() if self.profile else None
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        if profiler:
+            profiler.enable()
+        try:
+            with self.span("total"):
+                yield self
+        finally:
+            if profiler:
+                profiler.disable()
+                output = io.StringIO()
+                pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(30)
+                self.profile_text = output.getvalue()
+            if self.trace_memory:
+                self.peak_memory = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+
+    def to_dict(self) -> dict:
+        data = {
+            "spans": self.spans,
+            "counters": self.counters,
+        }
+        if self.peak_memory is not None:
+            data["peak_memory_bytes"] = self.peak_memory
+        if self.profile_text is not None:
+            data["profile"] = self.profile_text
+        return data
@@ -0,0 +1,182 @@
+"""
+Append-only journal of the changes to a saved session.
+
+A session saved as `tournament.json` gets a `tournament.json.journal` next to it, with one
+JSON line per result change, drop, new round or new players. Saving a change only appends
+a line, the full file is only rewritten when the journal is compacted. Loading replays the
+journal onto the saved file, so nothing is lost if the app closes without exporting.
+
+Every event sets values instead of changing them, so replaying a line twice does no harm,
+e.g. when the app stops after writing the snapshot but before emptying the journal.
+"""
+import json
+import os
+from classes import *
+from session import read_session_file, replace_session_file
+
+
+def journal_path(session_file: str) -> str:
+    return session_file + ".journal"
+
+
+class SessionJournal():
+    """
+    Appends events for `session_file` to its journal. Call `compact` with the full
+    session every now and then (`needs_compaction`), which rewrites the session file
+    and empties the journal.
+
+    To write the session file elsewhere, e.g. in a background thread, take a `mark`
+    together with the data and pass it to `snapshot_written` when done, which then
+    only removes the events that made it into the file.
+    """
+    def __init__(self, session_file: str, compact_every: int = 500):
+        self.session_file = session_file
+        self.path = journal_path(session_file)
+        self.compact_every = compact_every
+        # to tell if a mark is from before the last compaction
+        self.n_compactions = 0
+        # events since the last compaction, including the ones already in the file
+        self.n_events = count_journal_lines(self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+        # after a crash in the middle of a line, start the next event on its own line
+        if self.file.tell() and not ends_with_newline(self.path):
+            self.file.write("\n")
+            self.file.flush()
+
+    def append(self, event: dict):
+        self.file.write(json.dumps(event, ensure_ascii=False) + "\n")
+        # on disk as soon as possible, a crash should lose at most this line
+        self.file.flush()
+        self.n_events += 1
+
+    def record_result(self, round_index: int, row: int, matchup: Matchup):
+        self.append({
+            "event": "result",
+            "round": round_index,
+            "row": row,
+            "winner": matchup.winner,
+            "score_player1": matchup.score_player1,
+            "score_player2": matchup.score_player2,
+            "notes": matchup.notes,
+        })
+
+    def record_drop(self, player: Player):
+        self.append({"event": "drop", "player": player.name, "dropped": player.dropped})
+
+    def record_round(self, round_index: int, round: Round):
+        self.append({"event": "round", "round": round_index, "matchups": round.to_dict()["matchups"]})
+
+    def record_players(self, players: list[Player]):
+        self.append({"event": "players", "players": {player.name: player.dropped for player in players}})
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.n_events >= self.compact_every
+
+    def compact(self, data: dict):
+        """
+        Writes the full session `data` (see `session_to_dict`) and empties the journal.
+        """
+        replace_session_file(self.session_file, data)
+        self.file.truncate(0)
+        self.file.seek(0)
+        self.n_events = 0
+        self.n_compactions += 1
+
+    def mark(self) -> tuple[int, int]:
+        return (self.n_compactions, self.n_events)
+
+    def snapshot_written(self, mark: tuple[int, int]):
+        """
+        The session file was written with the data from when `mark` was taken,
+        so the events before it aren't needed anymore.
+        """
+        n_compactions, n_events = mark
+        if n_compactions != self.n_compactions or not n_events:
+            # compacted in the meantime, the file is newer than that snapshot
+            return
+        self.file.close()
+        with open(self.path, "r", encoding="utf-8") as f:
+            later_events = f.readlines()[n_events:]
+        temp_file = self.path + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            f.writelines(later_events)
+        os.replace(temp_file, self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.n_events -= n_events
+        self.n_compactions += 1
+
+    def close(self):
+        self.file.close()
+
+
+def count_journal_lines(path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def read_journal(path: str) -> list[dict]:
+    """
+    The events of a journal. A broken line from a crash while writing it is skipped,
+    it can only be followed by events written after restarting.
+    """
+    if not os.path.exists(path):
+        return []
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"Skipping incomplete line {line_number} of {path}")
+    return events
+
+
+def apply_journal_event(data: dict, event: dict):
+    """
+    Applies one journal event to session `data` as returned by `session_to_dict`.
+    """
+    kind = event["event"]
+    if kind == "result":
+        saved_round = data["rounds"][event["round"]]
+        for key in ("winner", "score_player1", "score_player2", "notes"):
+            if "columns" in saved_round:
+                saved_round["columns"][key][event["row"]] = event[key]
+            else:
+                saved_round["matchups"][event["row"]][key] = event[key]
+    elif kind == "drop":
+        data["players"][event["player"]] = event["dropped"]
+    elif kind == "round":
+        # already in the snapshot if it was compacted after this line was written
+        if event["round"] == len(data["rounds"]):
+            data["rounds"].append({"matchups": event["matchups"]})
+    elif kind == "players":
+        for name, dropped in event["players"].items():
+            data["players"].setdefault(name, dropped)
+    else:
+        print(f"Unknown journal event {kind}, skipped")
+
+
+def read_journaled_session(session_file: str) -> dict:
+    """
+    Reads a session file and replays its journal onto it, if there is one.
+    """
+    data = read_session_file(session_file)
+    data.setdefault("players", {})
+    data.setdefault("rounds", [])
+    events = read_journal(journal_path(session_file))
+    for event in events:
+        apply_journal_event(data, event)
+    if events:
+        print(f"Replayed {len(events)} journal events onto {session_file}")
+    return data
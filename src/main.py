@@ -1,6 +1,6 @@
 
 from PySide6.QtCore import (QCoreApplication, QMetaObject, QObject, QPoint,
-    QRect, QSize, QUrl, Qt, QTimer)
+    QRect, QSize, QUrl, Qt, QTimer, QThread, QSortFilterProxyModel, QStandardPaths)
 from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor, QFont,
     QFontDatabase, QIcon, QLinearGradient, QPalette, QPainter, QPixmap, QPen,
     QRadialGradient, QAction, QKeySequence)
@@ -10,7 +10,17 @@ from settings import SettingsDialog
 from utils import *
 from ui_swiss import *
 from classes import *
-import json
+from session import *
+from stats import StatsEngine
+from instrumentation import PairingMetrics
+from workers import RoundGenerationWorker
+from models import PlayersTableModel, RoundTableModel, WinnerDelegate
+from journal import SessionJournal, read_journaled_session
+from autosave import AutosaveWriter
+import argparse
+import os
+import sys
+import uuid
 
 
 # because things are often strings, we need to hard disallow
@@ -22,17 +32,68 @@ DISALLOWED_NAMES = set(
      "select winner..."]
 )
 
+# autosave once changes stop coming in for this long, but at least every
+# AUTOSAVE_MAX_DELAY seconds while they do, and never more often than AUTOSAVE_MIN_INTERVAL
+AUTOSAVE_DELAY = 2.0
+AUTOSAVE_MAX_DELAY = 30.0
+AUTOSAVE_MIN_INTERVAL = 10.0
+
+
+def unsaved_sessions_folder() -> str:
+    """
+    Where sessions that were never exported are autosaved, one file per session.
+    """
+    folder = os.path.join(QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation), "unsaved")
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def find_unsaved_sessions() -> list[str]:
+    """
+    The autosaves of sessions that were never exported, newest first.
+    """
+    folder = unsaved_sessions_folder()
+    files = [os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".json")]
+    return sorted(files, key=os.path.getmtime, reverse=True)
+
 
 class MainWindow(QtWidgets.QMainWindow):
     players: list[Player] = []
     rounds: list[Round] = []
 
-    def __init__(self, launch_data: dict | None):
+    def __init__(self, launch_data: dict | None, session_file: str | None = None,
+                 load_metrics: PairingMetrics | None = None, unsaved_file: str | None = None):
         QtWidgets.QMainWindow.__init__(self)
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
         self.setWindowTitle("Swiss Bracket Maker")
         self.settings = SettingsDialog(parent=self)
+        self.history = OpponentHistory()
+        self.stats = StatsEngine(self.players, self.rounds)
+        # timings and counters of every generated round, saved with the session
+        self.pairing_metrics: list[dict] = []
+        # the round being generated in the background, if any
+        self.round_worker: RoundGenerationWorker | None = None
+        self.round_progress: QProgressDialog | None = None
+        self.round_threads: dict[QThread, RoundGenerationWorker] = {}
+        # the table model of every round tab, by round index
+        self.round_models: dict[int, RoundTableModel] = {}
+        # the tab of every round, and what's in the ones that were built, least recently opened first
+        self.round_tabs: dict[int, QWidget] = {}
+        self.round_tab_contents: dict[int, QWidget] = {}
+        # changes are appended to this once the session has a file, see journal.py
+        self.journal: SessionJournal | None = None
+        # sessions without a file are autosaved to their own file in the app data folder,
+        # so several windows don't overwrite each other, see `find_unsaved_sessions`
+        self.unsaved_file = unsaved_file
+        self.autosave_writer = AutosaveWriter()
+        self.autosave_writer.saved.connect(self.on_autosaved)
+        self.autosave_writer.failed.connect(self.on_autosave_failed)
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.setSingleShot(True)
+        self.autosave_timer.timeout.connect(self.autosave)
+        self.autosave_pending_since: float | None = None
+        self.last_autosave = float("-inf")
 
         self.ui.ImportPlayersFileButton.clicked.connect(self.import_players_from_file)
         self.ui.importPlayersClipboardButton.clicked.connect(self.import_players_from_clipboard)
@@ -41,26 +102,38 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui.exportButton.clicked.connect(self.export_session)
         self.ui.settingsButton.clicked.connect(self.open_settings)
 
-        # set column headers in players table
-        self.ui.playersTableWidget.setColumnCount(5)
-        self.ui.playersTableWidget.setHorizontalHeaderLabels(["Drop", "Name", "Score", "Resistance", "Win Percentage"])
-        # self.ui.playersTableWidget.cellChanged.connect(self.on_player_cell_changed)
+        # players table, sorted through a proxy
+        self.players_model = PlayersTableModel(self)
+        self.players_model.player_dropped.connect(lambda player: self.journal_event(SessionJournal.record_drop, player))
+        players_proxy = QSortFilterProxyModel(self)
+        players_proxy.setSourceModel(self.players_model)
+        players_proxy.setSortRole(Qt.ItemDataRole.EditRole)
+        self.ui.playersTableView.setModel(players_proxy)
+        self.ui.playersTableView.setSortingEnabled(True)
+        self.ui.playersTableView.sortByColumn(-1, Qt.SortOrder.AscendingOrder)
         self.ui.tabWidget.currentChanged.connect(self.tab_change_controller)
 
         # Check if we loaded from file or not
         print(f"Launching with previous data: {launch_data is not None}")
         if launch_data:
-            self.import_session(launch_data)
+            if not self.import_session(launch_data, load_metrics):
+                # leave the broken file be instead of autosaving over it
+                self.unsaved_file = None
+            elif session_file:
+                self.start_journal(session_file)
 
     def tab_change_controller(self, index):
         """
-        We recalculate the players table every time we click on the tab
+        We update the players table every time we click on the tab,
+        and round tabs get their table the first time they're opened
         """
         tabname = self.ui.tabWidget.tabText(index)
         print("Current tab name:", tabname)
 
         if tabname == "Players":
-            self.create_players_table()
+            self.update_players_table()
+        elif tabname.startswith("R") and tabname[1:].isdigit():
+            self.build_round_tab(int(tabname[1:]) - 1)
 
 
     def import_players_from_file(self):
@@ -83,6 +156,8 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.players.append(new_player)
                 count += 1
                 current_player_names.add(name.lower())
+        if count:
+            self.journal_event(SessionJournal.record_players, self.players[-count:])
         self.ui.settingsMessage.setText(f"Imported {count} players successfully")
 
 
@@ -104,72 +179,13 @@ class MainWindow(QtWidgets.QMainWindow):
             self.players.append(new_player)
             count += 1
             current_player_names.add(name.lower())
+        if count:
+            self.journal_event(SessionJournal.record_players, self.players[-count:])
         self.ui.settingsMessage.setText(f"Imported {count} players successfully")
 
-    def create_players_table(self):
-        # First calculate all the players' stats
-        player_info_list = calculate_players_stats(self.players, self.rounds)
-
-        print([(p.player.name, p.score, p.resistance) for p in player_info_list if p.score > 10])
-
-        # Clear the table
-        self.ui.playersTableWidget.setSortingEnabled(False)
-        self.ui.playersTableWidget.clearContents()
-        self.ui.playersTableWidget.setRowCount(0)
-
-        # Create the table
-        for player_info in player_info_list:
-            self.create_player_table_entry(player_info)
-
-        self.ui.playersTableWidget.setSortingEnabled(True)
-
-
-    def create_player_table_entry(self, player_info: PlayerInfo):
-        # Get the table row index
-        rowPosition = self.ui.playersTableWidget.rowCount()
-        self.ui.playersTableWidget.insertRow(rowPosition)
-
-        # Create a centered checkbox cell
-        checkbox = QCheckBox()
-        checkbox.setChecked(player_info.player.dropped)
-        checkbox.stateChanged.connect(lambda state, player=player_info.player: self.on_checkbox_state_changed(state, player))
-        # Create a widget to hold the layout
-        centered_widget = QWidget()
-        layout = QHBoxLayout(centered_widget)
-        layout.addWidget(checkbox)
-        layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        layout.setContentsMargins(0, 0, 0, 0)
-
-        # Dropped checkbox
-        self.ui.playersTableWidget.setCellWidget(rowPosition, 0, centered_widget)
-        # Player name
-        self.ui.playersTableWidget.setItem(rowPosition, 1, QTableWidgetItem(player_info.player.name))
-        # Score
-        player_score = QTableWidgetItem()
-        player_score.setData(Qt.ItemDataRole.EditRole, player_info.score)
-        self.ui.playersTableWidget.setItem(rowPosition, 2, player_score)
-        # TODO: check if double convert is needed with current python version and floats https://stackoverflow.com/questions/455612/limiting-floats-to-two-decimal-points
-        # TODO: number styling to be consistent? 0 padding etc
-        # Resistance
-        player_res = QTableWidgetItem()
-        player_res.setData(Qt.ItemDataRole.EditRole, round(player_info.resistance, 2))
-        player_res.setData(Qt.ItemDataRole.DisplayRole, f"{round(player_info.resistance, 2)}")
-        self.ui.playersTableWidget.setItem(rowPosition, 3, player_res)
-        # self.ui.playersTableWidget.setItem(rowPosition, 3, QTableWidgetItem("{:.2f}%".format(player_info.resistance)))
-
-        # Win percentage
-        if player_info.n_played:
-            player_win_percentage = player_info.n_wins / player_info.n_played * 100
-        else:
-            player_win_percentage = 0
-
-        # TODO: make it sort numerically instead of by string (i.e. 100 > 50)
-        player_win = QTableWidgetItem()
-        player_win.setData(Qt.ItemDataRole.EditRole, round(player_win_percentage, 2))
-        player_win.setData(Qt.ItemDataRole.DisplayRole, f"{round(player_win_percentage, 2)}%")
-        self.ui.playersTableWidget.setItem(rowPosition, 4, player_win)
-        # self.ui.playersTableWidget.setItem(rowPosition, 4, QTableWidgetItem("{:.2f}%".format(player_win_percentage)))
-
+    def update_players_table(self):
+        # only the rows that changed since the last visit are redrawn
+        self.players_model.update(self.stats.get_stats())
 
 
     def generate_round(self):
@@ -177,100 +193,188 @@ class MainWindow(QtWidgets.QMainWindow):
             self.ui.settingsMessage.setText(f"Import players before generating a round!")
             return
 
+        if self.round_worker is not None:
+            return
+
         if not self.confirm_start_round_generation():
             return
 
-        # Generate the matchups and display them
-        matchups = generate_matchups(self.players, self.rounds, self.settings)
+        # Generate the matchups in the background, on_round_generated displays them
+        metrics = PairingMetrics(profile=self.settings.profile_pairing, trace_memory=self.settings.profile_pairing)
+        worker = RoundGenerationWorker(self.players, self.rounds, self.settings, metrics)
+        thread = QThread(self)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.finished.connect(self.on_round_generated)
+        worker.failed.connect(self.on_round_generation_failed)
+        worker.done.connect(thread.quit)
+        thread.finished.connect(self.on_round_thread_finished)
+        self.round_worker = worker
+        # keep both alive until the thread is done, also after cancelling
+        self.round_threads[thread] = worker
+
+        self.ui.generateRound.setEnabled(False)
+        self.round_progress = QProgressDialog(f"Generating round {worker.round_number}...", "Cancel", 0, 0, self)
+        self.round_progress.setWindowTitle("Round Generation")
+        self.round_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.round_progress.setMinimumDuration(500)
+        self.round_progress.canceled.connect(self.cancel_round_generation)
+        thread.start()
+
+    def on_round_generated(self, worker: RoundGenerationWorker, matchups: list[Matchup], metrics: PairingMetrics):
+        if worker is not self.round_worker:
+            # cancelled
+            return
+        self.end_round_generation()
+        if worker.round_number != len(self.rounds) + 1:
+            QMessageBox.warning(self, "Round Generation", "The session changed while the round was being generated, "
+                                                          "please generate it again.")
+            return
 
-        new_round = Round(matchups)
+        print(f"Round generation: {metrics}")
+        self.pairing_metrics.append({"round": worker.round_number, **metrics.to_dict()})
+
+        new_round = apply_byes(matchups)
         self.rounds.append(new_round)
         round_number = len(self.rounds)
-        for matchup in new_round.matchups:
-            if not matchup.player2:
-                matchup.winner = matchup.player1
-                matchup.score_player1 = 1.0
-                matchup.notes = "BYE"
+        self.history.add_round(new_round)
+        self.journal_event(SessionJournal.record_round, round_number - 1, new_round)
+        if metrics.counters["deadline_reached"]:
+            self.ui.settingsMessage.setText(f"Round {round_number} was paired at the deadline, "
+                                            f"the pairing may not be optimal (cost {metrics.counters['cost']}).")
+        elif not metrics.counters["optimal"]:
+            self.ui.settingsMessage.setText(f"Round {round_number} was matched within the score group window or blocks, "
+                                            f"the pairing may not be optimal (cost {metrics.counters['cost']}).")
 
         self.generate_round_tab(new_round, round_number)
 
+    def on_round_generation_failed(self, worker: RoundGenerationWorker, message: str):
+        if worker is not self.round_worker:
+            return
+        self.end_round_generation()
+        QMessageBox.critical(self, "Round Generation Failed", f"Could not generate the round:\n{message}")
 
-    def generate_round_tab(self, round: Round, round_number: int):
-        # Create the table for the new round
-        table = QTableWidget()
-        table.setColumnCount(6)
-        table.setHorizontalHeaderLabels(["P1", "P2", "Winner", "P1Score", "P2Score", "Notes"])
-        table.setSortingEnabled(True)
-
-        for idx, matchup in enumerate(round.matchups):
-            table.insertRow(idx)
-            winner_combo = QComboBox()
-            winner_combo.setEditable(True)
-            winner_combo.lineEdit().setReadOnly(True)
-
-            winner_combo.lineEdit().setPlaceholderText("Select winner...")
-            winner_combo.setStyleSheet("QComboBox { combobox-popup: 0; }")  # Optional styling
-
-            winner_combo.addItem(matchup.player1)
-            if matchup.player2 != "":
-                winner_combo.addItem(matchup.player2)
-            winner_combo.addItem("No Winner")
-            winner_combo.addItem("Delayed")
-
-            # If a winner already exists (e.g., for BYEs), select them
-            if matchup.winner:
-                winner_combo.setCurrentText(matchup.winner)
-            else:
-                winner_combo.setCurrentIndex(-1)  # Show placeholder, no selection
-
-            winner_combo.setProperty("matchup", matchup)
-
-            # Name columns should not be editable
-            p1_item = QTableWidgetItem(matchup.player1)
-            p2_item = QTableWidgetItem(matchup.player2)
-            p1_item.setFlags(p1_item.flags() & ~Qt.ItemIsEditable)
-            p2_item.setFlags(p2_item.flags() & ~Qt.ItemIsEditable)
-            table.setItem(idx, 0, p1_item)
-            table.setItem(idx, 1, p2_item)
-
-            table.setCellWidget(idx, 2, winner_combo)
-            winner_combo.currentTextChanged.connect(lambda _, combo=winner_combo, table=table: self.on_winner_changed(combo, table))
-            
-            p1_score_item = QTableWidgetItem()
-            p1_score_item.setData(Qt.ItemDataRole.EditRole, matchup.score_player1)
-            table.setItem(idx, 3, p1_score_item)
-
-            p2_score_item = QTableWidgetItem()
-            p2_score_item.setData(Qt.ItemDataRole.EditRole, matchup.score_player2)
-            table.setItem(idx, 4, p2_score_item)
-
-            notes_item = QTableWidgetItem(str(matchup.notes))
-
-            table.setItem(idx, 5, notes_item)
+    def cancel_round_generation(self):
+        if self.round_worker is None:
+            return
+        print(f"Cancelled generating round {self.round_worker.round_number}")
+        # the thread finishes the pairing in the background and the result is dropped
+        self.round_worker.cancelled = True
+        self.end_round_generation()
+
+    def end_round_generation(self):
+        self.round_worker = None
+        if self.round_progress is not None:
+            progress, self.round_progress = self.round_progress, None
+            progress.canceled.disconnect(self.cancel_round_generation)
+            progress.close()
+            progress.deleteLater()
+        self.ui.generateRound.setEnabled(True)
+
+    def on_round_thread_finished(self):
+        for thread in [thread for thread in self.round_threads if thread.isFinished()]:
+            del self.round_threads[thread]
+            thread.deleteLater()
+
+    def closeEvent(self, event):
+        # never exported, so its autosave would be kept for recovery forever
+        if self.journal is None and self.players:
+            reply = QMessageBox.question(
+                self,
+                "Save Tournament",
+                "This tournament was never saved. Save it before closing?",
+                QMessageBox.StandardButton.Save | QMessageBox.StandardButton.Discard | QMessageBox.StandardButton.Cancel
+            )
+            if reply == QMessageBox.StandardButton.Save:
+                self.export_session()
+            if reply == QMessageBox.StandardButton.Cancel or (reply == QMessageBox.StandardButton.Save and self.journal is None):
+                event.ignore()
+                return
+
+        # a thread that's still running when the window is gone takes the app down with it
+        for thread in self.round_threads:
+            thread.wait()
+        if self.journal is None:
+            # the save was declined, there's nothing to recover
+            self.autosave_timer.stop()
+            self.autosave_writer.wait()
+            self.discard_unsaved_file()
+        elif self.autosave_timer.isActive():
+            # save what's left before going
+            self.autosave_timer.stop()
+            self.autosave(force=True)
+        self.autosave_writer.wait(10)
+        if self.journal is not None:
+            self.journal.close()
+        super().closeEvent(event)
+
+
+    def generate_round_tab(self, round: Round, round_number: int, lazy: bool = False):
+        """
+        Adds the tab of a round. With `lazy`, the tab stays empty until it's first
+        opened, see `build_round_tab`. The model is always there for the results.
+        """
+        round_index = round_number - 1
+        model = RoundTableModel(round, round_index, self)
+        model.winner_selected.connect(lambda matchup, winner, model=model: self.on_winner_changed(model, matchup, winner))
+        model.matchup_edited.connect(lambda matchup, model=model: self.on_matchup_edited(model, matchup))
+        self.round_models[round_index] = model
 
-            # attach round index and matchup data to the first column
-            p1_item.setData(Qt.UserRole, {"round_idx": round_number-1, "matchup": matchup})
+        container = QWidget()
+        layout = QVBoxLayout(container)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.round_tabs[round_index] = container
 
+        # Create the tab
+        self.ui.tabWidget.addTab(container, f"R{round_number}")
+        if not lazy:
+            self.build_round_tab(round_index)
+        self.ui.settingsMessage.setText(f"Created round {round_number}.")
 
-        table.cellChanged.connect(self.on_cell_changed)
 
+    def build_round_tab(self, round_index: int):
+        """
+        Fills the tab of a round with its table and buttons, if that didn't happen yet.
+        Only the last `round_tables_kept` tabs opened keep theirs (all if 0).
+        """
+        if round_index in self.round_tab_contents:
+            # most recently used goes last
+            self.round_tab_contents[round_index] = self.round_tab_contents.pop(round_index)
+            return
+        model = self.round_models[round_index]
+
+        # Create the table for the round
+        table = QTableView()
+        proxy = QSortFilterProxyModel(table)
+        proxy.setSourceModel(model)
+        proxy.setSortRole(Qt.ItemDataRole.EditRole)
+        table.setModel(proxy)
+        table.setItemDelegateForColumn(RoundTableModel.WINNER, WinnerDelegate(table))
+        table.setEditTriggers(QAbstractItemView.EditTrigger.AllEditTriggers)
+        table.setSortingEnabled(True)
+        # keep the generated order until a column is clicked
+        table.sortByColumn(-1, Qt.SortOrder.AscendingOrder)
 
-        container = QWidget()
-        layout = QVBoxLayout(container)
+        content = QWidget()
+        layout = QVBoxLayout(content)
 
         button_row = QHBoxLayout()
         button_row.setSpacing(10)
 
         paste_winners_button = QPushButton("Paste Winners")
-        paste_winners_button.clicked.connect(lambda: self.paste_winners(table))
+        paste_winners_button.clicked.connect(lambda: self.paste_winners(model))
         button_row.addWidget(paste_winners_button)
 
+        import_results_button = QPushButton("Import Results")
+        import_results_button.clicked.connect(lambda: self.import_results_from_file(model))
+        button_row.addWidget(import_results_button)
+
         fill_unfilled_button = QPushButton("Set \"No Winner\" for Unfilled")
-        fill_unfilled_button.clicked.connect(lambda: self.unfilled_to_no_winner(table))
+        fill_unfilled_button.clicked.connect(lambda: self.unfilled_to_no_winner(model))
         button_row.addWidget(fill_unfilled_button)
 
         clipboard_button = QPushButton("Round to Clipboard")
-        clipboard_button.clicked.connect(lambda: self.round_to_clipboard(table))
+        clipboard_button.clicked.connect(lambda: self.round_to_clipboard(model))
         button_row.addWidget(clipboard_button)
 
         # TODO: rethink; remove for now, possibly just remove or only for last round or error if not last round or something
@@ -282,11 +386,16 @@ class MainWindow(QtWidgets.QMainWindow):
         layout.addLayout(button_row)
 
         layout.addWidget(table)
-        container.setLayout(layout)
+        content.setLayout(layout)
 
-        # Create the tab
-        self.ui.tabWidget.addTab(container, f"R{round_number}")
-        self.ui.settingsMessage.setText(f"Created round {round_number}.")
+        self.round_tabs[round_index].layout().addWidget(content)
+        self.round_tab_contents[round_index] = content
+
+        # free the tables that weren't looked at for the longest
+        while 0 < self.settings.round_tables_kept < len(self.round_tab_contents):
+            evicted = next(iter(self.round_tab_contents))
+            self.round_tab_contents.pop(evicted).deleteLater()
+            print(f"Freed the table of round {evicted + 1}")
 
 
     def confirm_start_round_generation(self):
@@ -302,11 +411,7 @@ class MainWindow(QtWidgets.QMainWindow):
         # otherwise we do some sanity checks
         # first we check if there's delays left from very old rounds
         text = ""
-        for i, old_round in enumerate(self.rounds[:-1]):
-            delays = 0
-            for matchup in old_round.matchups:
-                if matchup.winner == "Delayed":
-                    delays += 1
+        for i, delays in enumerate(self.history.delays_per_round[:-1]):
             if delays:
                 text += f"Round {i+1} still has {delays} delayed matches.\n"
 
@@ -349,12 +454,24 @@ class MainWindow(QtWidgets.QMainWindow):
         else:
             return False
 
-    def on_winner_changed(self, combo: QComboBox, table: QTableWidget):
-        matchup = combo.property("matchup")
+    def on_winner_changed(self, model: RoundTableModel, matchup: Matchup, winner_name: str):
+        self.set_matchup_winner(model.round_index, matchup, winner_name)
+        print(f"{matchup} winner changed to {matchup.winner}")
+        model.refresh_matchup(matchup)
+
 
-        winner_name = combo.currentText()
+    def on_matchup_edited(self, model: RoundTableModel, matchup: Matchup):
+        self.stats.update_matchup(model.round_index, matchup)
+        self.journal_event(SessionJournal.record_result, model.round_index, model.row_of(matchup), matchup)
+
+
+    def set_matchup_winner(self, round_index: int, matchup: Matchup, winner_name: str):
+        """
+        Sets the winner and the matching scores, and keeps the history and stats up to date.
+        Doesn't touch the round table, see `RoundTableModel.refresh_matchup` and `refresh_results`.
+        """
+        self.history.update_result(round_index, matchup.winner, winner_name)
         matchup.winner = winner_name
-        print(f"{matchup} winner changed to {matchup.winner}")
         if winner_name == matchup.player1:
             matchup.score_player1 = 1.0
             matchup.score_player2 = 0.0
@@ -364,80 +481,45 @@ class MainWindow(QtWidgets.QMainWindow):
         else:  # No Winner / Delayed
             matchup.score_player1 = 0.0
             matchup.score_player2 = 0.0
+        self.stats.update_matchup(round_index, matchup)
+        self.journal_event(SessionJournal.record_result, round_index, self.round_models[round_index].row_of(matchup), matchup)
 
-        self.update_matchup_row_scores(table, matchup)
-
-    def on_cell_changed(self, row, col):
-        table = self.sender()
-        item = table.item(row, col)
-        # first column stores the data in userrole
-        matchup = table.item(row, 0).data(Qt.UserRole)["matchup"]
-        if not matchup:
-            print(f"Error: item at row {row} and col {col} does not have matchup data attached")
-            return
-
-        value = item.text()
 
-        if col == 3:
-            matchup.score_player1 = float(value)
-            print(f"Updated p1 score in {matchup} to {value}")
-        elif col == 4:
-            matchup.score_player2 = float(value)
-            print(f"Updated p2 score in {matchup} to {value}")
-        elif col == 5:
-            matchup.notes = value
-            print(f"Updated notes in {matchup} to {value}")
+    def paste_winners(self, model: RoundTableModel):
+        self.apply_results(model, get_clipboard_data(), "clipboard")
 
+    def import_results_from_file(self, model: RoundTableModel):
+        filename, _ = QFileDialog.getOpenFileName(self, "Import Results", "", "Results (*.csv *.tsv *.txt);;All files (*)")
+        if not filename:
+            return
+        with open(filename, 'r', encoding='utf-8-sig') as f:
+            self.apply_results(model, f.read(), filename)
 
-    def update_matchup_row_scores(self, table: QTableWidget, matchup: Matchup):
+    def apply_results(self, model: RoundTableModel, text: str, source: str):
         """
-        Updates *the view of* the scores for a single row after updating the winner.
-        Is O(N), if that becomes problematic caching a mapping dict can make it essentially
-        O(1) but is a bit painful.
+        Sets the winners from pasted or loaded text, see `parse_results` and `match_results`
+        for the formats. All matchups are updated first and the table is refreshed once,
+        then the rows that didn't match any player of the round are shown.
         """
-        row = self.find_round_row_by_matchup(table, matchup)
-        if row == -1:
-            print("Error: matchup row to be updated not found")
-            return
-
-        # stops `on_cell_changed` from being hit here
-        table.blockSignals(True)
-        table.item(row, 3).setText(str(matchup.score_player1))
-        table.item(row, 4).setText(str(matchup.score_player2))
-        table.blockSignals(False)
-
-    def find_round_row_by_matchup(self, table: QTableWidget, matchup: Matchup):
-        for row in range(table.rowCount()):
-            p1_item = table.item(row, 0)  # first column has the data in UserRole
-            if p1_item.data(Qt.UserRole)["matchup"] is matchup:
-                return row
-        return -1
-
-
-    def paste_winners(self, table):
-        # Get clipboard text and split into lines/names
-        text = get_clipboard_data()
-        winners = [name.strip().lower() for name in text.splitlines() if name.strip()]
-
-        # Go through each row of the table and find matches
-        for row in range(table.rowCount()):
-            player1_item = table.item(row, 0)
-            player2_item = table.item(row, 1)
-
-            player1 = player1_item.text().strip().lower()
-            player2 = player2_item.text().strip().lower()
-
-            # names to players
-            for winner in winners:
-                if winner == player1 or winner == player2:
-                    widget = table.cellWidget(row, 2)
-                    if isinstance(widget, QComboBox):
-                        index = widget.findText(winner, Qt.MatchFixedString)
-                        if index >= 0:
-                            widget.setCurrentIndex(index)
-                    break
-
-    def unfilled_to_no_winner(self, table):
+        start = time.time()
+        results, unmatched = match_results(model.round.matchups, parse_results(text))
+        changed = 0
+        for matchup, winner_name in results:
+            if matchup.winner != winner_name:
+                self.set_matchup_winner(model.round_index, matchup, winner_name)
+                changed += 1
+        model.refresh_results()
+        print(f"Applied {changed} results from {source} in {time.time() - start} seconds, {len(unmatched)} unmatched")
+
+        if unmatched:
+            shown = "\n".join(unmatched[:20])
+            if len(unmatched) > 20:
+                shown += f"\n... and {len(unmatched) - 20} more"
+            QMessageBox.warning(self, "Unmatched results",
+                                f"Set {changed} winners. These {len(unmatched)} lines didn't match "
+                                f"any player of round {model.round_index + 1}:\n\n{shown}")
+
+    def unfilled_to_no_winner(self, model: RoundTableModel):
         """
         Fills every matchup with no winner selected to `No Winner`.
         Nothing selected usually means "not played yet", which
@@ -445,11 +527,7 @@ class MainWindow(QtWidgets.QMainWindow):
         the match will not be played, and will count as a loss for both players.
         """
         # first we count for a popup
-        count = 0
-        for row in range(table.rowCount()):
-            matchup: Matchup = table.item(row, 0).data(Qt.UserRole)["matchup"]
-            if not matchup.winner:
-                count += 1
+        count = sum(not matchup.winner for matchup in model.round.matchups)
 
         reply = QMessageBox.question(
             self,
@@ -459,25 +537,20 @@ class MainWindow(QtWidgets.QMainWindow):
         )
 
         if reply == QMessageBox.StandardButton.Yes:
-            for row in range(table.rowCount()):
-                matchup: Matchup = table.item(row, 0).data(Qt.UserRole)["matchup"]
+            for matchup in model.round.matchups:
                 if not matchup.winner:
-                    widget = table.cellWidget(row, 2)
-                    if isinstance(widget, QComboBox):
-                        index = widget.findText("No Winner", Qt.MatchFixedString)
-                        if index >= 0:
-                            widget.setCurrentIndex(index)
+                    self.set_matchup_winner(model.round_index, matchup, "No Winner")
+            model.refresh_results()
 
 
-    def round_to_clipboard(self, table: QTableWidget):
-        round_index = table.item(0, 0).data(Qt.UserRole)["round_idx"]
+    def round_to_clipboard(self, model: RoundTableModel):
+        round_index = model.round_index
         print(f"Saving round {round_index+1} to clipboard")
         # take into account only previous rounds to get stats pre-round
-        player_stats_dict = calculate_players_stats(self.players, self.rounds[:round_index], as_dict=True)
+        player_stats_dict = self.stats.get_stats(round_index, as_dict=True)
 
         output_str = ""
-        for row in range(table.rowCount()):
-            matchup: Matchup = table.item(row, 0).data(Qt.UserRole)["matchup"]
+        for matchup in model.round.matchups:
             output_str += self.format_match_for_clipboard(matchup, player_stats_dict) + "\n"
 
         QApplication.clipboard().setText(output_str)
@@ -529,47 +602,140 @@ class MainWindow(QtWidgets.QMainWindow):
         return result
 
 
-    def export_session(self):
-        # Convert data to dict
-        player_dump = {
-            player.name: player.dropped for player in self.players
-        }
+    def session_data(self) -> dict:
         settings_dump = {
             "p1_ext_point": self.settings.p1_ext_point,
             "p2_ext_point": self.settings.p2_ext_point,
             "random_ext_point_assignment": self.settings.random_ext_point_assignment,
             "selected_clipboard_format": self.settings.selected_clipboard_format,
+            "pairing_window": self.settings.pairing_window,
+            "matching_backend": self.settings.matching_backend,
+            "profile_pairing": self.settings.profile_pairing,
+            "pairing_seeds": self.settings.pairing_seeds,
+            "pairing_deadline": self.settings.pairing_deadline,
+            "pairing_block_size": self.settings.pairing_block_size,
+            "round_tables_kept": self.settings.round_tables_kept,
         }
-        data = {
-            "players": player_dump,
-            "rounds": [r.to_dict() for r in self.rounds],
-            "settings": settings_dump,
-        }
+        return session_to_dict(self.players, self.rounds, settings_dump, list(self.pairing_metrics))
 
+    def export_session(self):
         # Create new file
-        file_name, _ = QFileDialog.getSaveFileName(
+        file_name, selected_filter = QFileDialog.getSaveFileName(
             self,
             "Save Tournament Data",
             "",
-            "JSON Files (*.json)"
+            "JSON Files (*.json);;Compact Binary Files (*.swiss)"
         )
 
         if not file_name:
             return
 
-        # Ensure file ends with .json
-        if not file_name.endswith(".json"):
-            file_name += ".json"
+        # Ensure file ends with .json or .swiss, which picks the format
+        if not file_name.endswith((".json", BINARY_EXTENSION)):
+            file_name += BINARY_EXTENSION if BINARY_EXTENSION in selected_filter else ".json"
         try:
-            with open(file_name, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
+            # an autosave finishing later would overwrite the export with older data
+            self.autosave_writer.wait()
+            # the export is the journal's snapshot, later changes are appended to its journal
+            self.start_journal(file_name)
+            self.compact_journal()
+            self.autosave_timer.stop()
+            self.autosave_pending_since = None
+            # it has a file now, nothing left to recover
+            self.discard_unsaved_file()
 
             QMessageBox.information(self, "Export Successful", f"Tournament saved to:\n{file_name}")
         except Exception as e:
             QMessageBox.critical(self, "Export Failed", f"Could not save file:\n{e}")
 
 
-    def import_session(self, data):
+    def start_journal(self, session_file: str):
+        if self.journal is not None:
+            if self.journal.session_file == session_file:
+                return
+            self.journal.close()
+        self.journal = SessionJournal(session_file)
+        print(f"Journaling changes to {self.journal.path}")
+
+    def journal_event(self, record, *args):
+        """
+        Appends an event with `record`, one of the `SessionJournal.record_...` methods,
+        if the session has a file, and schedules an autosave, which also compacts the journal.
+        """
+        if self.journal is not None:
+            record(self.journal, *args)
+        self.schedule_autosave(urgent=self.journal is not None and self.journal.needs_compaction)
+
+    def compact_journal(self):
+        start = time.time()
+        self.journal.compact(self.session_data())
+        print(f"Saved {self.journal.session_file} in {time.time() - start} seconds")
+
+    def schedule_autosave(self, urgent: bool = False):
+        """
+        Bursts of changes, like pasting a whole round of results, end up in one autosave.
+        """
+        now = time.monotonic()
+        if self.autosave_pending_since is None:
+            self.autosave_pending_since = now
+        # don't put it off forever while results keep coming in
+        due = now if urgent else min(now + AUTOSAVE_DELAY, self.autosave_pending_since + AUTOSAVE_MAX_DELAY)
+        due = max(due, self.last_autosave + AUTOSAVE_MIN_INTERVAL)
+        self.autosave_timer.start(int(max(0.0, due - now) * 1000))
+
+    def discard_unsaved_file(self):
+        if self.unsaved_file is not None and os.path.exists(self.unsaved_file):
+            os.remove(self.unsaved_file)
+        self.unsaved_file = None
+
+    def autosave_file(self) -> str:
+        if self.journal is not None:
+            return self.journal.session_file
+        if self.unsaved_file is None:
+            self.unsaved_file = os.path.join(unsaved_sessions_folder(), f"{uuid.uuid4().hex}.json")
+        return self.unsaved_file
+
+    def autosave(self, force: bool = False):
+        if self.autosave_writer.busy and not force:
+            # the previous one is still being written, check back soon
+            self.autosave_timer.start(500)
+            return
+        self.autosave_pending_since = None
+        self.last_autosave = time.monotonic()
+
+        # the data is taken here, only writing it happens in the background
+        start = time.perf_counter()
+        data = self.session_data()
+        mark = self.journal.mark() if self.journal is not None else None
+        self.autosave_writer.save(self.autosave_file(), data, mark)
+        print(f"Autosave snapshot took {time.perf_counter() - start} seconds")
+
+    def on_autosaved(self, file_name: str, mark, seconds: float):
+        # the journal events up to the snapshot are in the file now
+        if mark is not None and self.journal is not None and self.journal.session_file == file_name:
+            self.journal.snapshot_written(mark)
+        print(f"Autosaved {file_name} in {seconds} seconds ({self.autosave_writer.latency_stats()})")
+        self.ui.statusbar.showMessage(f"Autosaved at {time.strftime('%H:%M:%S')}")
+
+    def on_autosave_failed(self, file_name: str, message: str):
+        self.ui.statusbar.showMessage(f"Autosave to {file_name} failed: {message}")
+
+
+    def import_session(self, data, metrics: PairingMetrics | None = None) -> bool:
+        """
+        Replaces the current session with a saved one. The saved one is checked and
+        built first, so if it's broken nothing changes and False is returned.
+        Pass `metrics` with the parsing already timed to see all steps together.
+        """
+        print("Rebuilding session")
+        metrics = metrics or PairingMetrics()
+        try:
+            players, rounds, saved_settings = session_from_dict(data, metrics)
+        except SessionError as e:
+            print(e)
+            QMessageBox.critical(self, "Import Failed", str(e))
+            return False
+
         # Delete old tabs
         tabs_to_remove = []
         for i in range(self.ui.tabWidget.count())[::-1]:
@@ -579,49 +745,27 @@ class MainWindow(QtWidgets.QMainWindow):
         for i in sorted(tabs_to_remove, reverse=True):
             self.ui.tabWidget.removeTab(i)
 
-        print("Rebuilding session")
-        start = time.time()
-
-        # Step 1: Rebuild players
-        self.players = []
-        for p_name, p_dropped in data.get("players", {}).items():
-            p = Player(p_name, dropped=p_dropped)
-            self.players.append(p)
-
-        # Step 2: Rebuild rounds and matchups
-        self.rounds = []
-        for round_number, r_data in enumerate(data.get("rounds", [])):
-            matchups = []
-            for saved_matchup in r_data["matchups"]:
-                p1 = saved_matchup["player1"]
-                p2 = saved_matchup["player2"]
-                notes = saved_matchup["notes"]
-
-                matchup = Matchup(p1, p2, notes)
-                matchup.score_player1 = saved_matchup["score_player1"]
-                matchup.score_player2 = saved_matchup["score_player2"]
-                matchup.winner = saved_matchup["winner"]
-
-                matchups.append(matchup)
-            saved_round = Round(matchups)
-            self.rounds.append(saved_round)
-            self.generate_round_tab(saved_round, round_number + 1)
-
-        # Step 3: Override default settings
-        if "settings" in data.keys():
-            self.settings.set_settings(data['settings'])
-
-        print(f"Session rebuilding took {time.time() - start} seconds")
-
-
-    def on_checkbox_state_changed(self, state: int, player: Player):
-        if state == Qt.CheckState.Checked.value:
-            print(f"{player.name} is now dropped.")
-            player.dropped = True
-        else:
-            print(f"{player.name} is now active.")
-            player.dropped = False
-
+        self.players, self.rounds = players, rounds
+        for model in self.round_models.values():
+            model.deleteLater()
+        self.round_models = {}
+        self.round_tabs = {}
+        self.round_tab_contents = {}
+        self.pairing_metrics = data.get("pairing_metrics", [])
+        with metrics.span("tabs"):
+            # tables are only built when their tab is opened
+            for round_number, saved_round in enumerate(self.rounds):
+                self.generate_round_tab(saved_round, round_number + 1, lazy=True)
+        with metrics.span("stats"):
+            self.history = OpponentHistory(self.rounds)
+            self.stats.reset(self.players, self.rounds)
+
+        # Override default settings
+        if saved_settings:
+            self.settings.set_settings(saved_settings)
+
+        print(f"Session loading: {metrics}")
+        return True
 
 
     def on_generate_final_bracket_clicked(self):
@@ -684,7 +828,7 @@ class MainWindow(QtWidgets.QMainWindow):
                     QMessageBox.warning(self, "Invalid Input", "More players selected than are listed.")
                     return
 
-                player_info_list = calculate_players_stats(self.players, self.rounds)
+                player_info_list = self.stats.get_stats()
                 sorted_players_info = sorted(player_info_list, key=lambda p: (p.score, p.resistance), reverse=True)
                 print(sorted_players_info)
                 selected_players = sorted_players_info[:num]
@@ -725,7 +869,7 @@ class MainWindow(QtWidgets.QMainWindow):
             try:
                 wins = int(text)
                 threshold_score = wins  # Adjust if you use a different score metric
-                player_info_list = calculate_players_stats(self.players, self.rounds)
+                player_info_list = self.stats.get_stats()
                 selected_players_info = [p for p in player_info_list if p.score >= threshold_score]
                 if len(selected_players_info) < 2:
                     QMessageBox.warning(self, "Invalid Input", "Not enough players have a high enough score.")
@@ -838,6 +982,10 @@ class StartupDialog(QDialog):
         super().__init__()
         self.setWindowTitle("Swiss Bracket Maker")
         self.choice = None
+        self.file_name = None
+        self.load_metrics = None
+        # the autosave of a session that was never exported, if one was recovered
+        self.unsaved_file = None
 
         layout = QVBoxLayout(self)
         label = QLabel("How do you want to launch?")
@@ -870,11 +1018,25 @@ class StartupDialog(QDialog):
         button_new.clicked.connect(lambda: self.select("new"))
         button_prev.clicked.connect(lambda: self.select("prev"))
 
+        # left behind when the app didn't close cleanly, e.g. by a crash
+        self.unsaved_sessions = find_unsaved_sessions()
+        self.button_recover = QPushButton(f"Recover unsaved ({len(self.unsaved_sessions)})")
+        self.button_recover.setMinimumSize(160, 36)
+        self.button_recover.setVisible(bool(self.unsaved_sessions))
+        button_layout.addWidget(self.button_recover)
+        self.button_recover.clicked.connect(lambda: self.select("recover"))
+
         layout.addLayout(button_layout)
 
     def select(self, value):
         if value == "prev":
             self.choice = self.read_input_file()
+        elif value == "recover":
+            n_unsaved = len(self.unsaved_sessions)
+            self.choice = self.recover_unsaved_session()
+            if len(self.unsaved_sessions) < n_unsaved:
+                # one was discarded, stay to pick what to do next
+                return
 
         self.accept()
 
@@ -883,28 +1045,74 @@ class StartupDialog(QDialog):
             self,
             "Load Tournament Data",
             "",
-            "JSON Files (*.json)"
+            "Tournament Files (*.json *.swiss);;All files (*)"
         )
         if not file_name:
             return
-        # Parse the file
+        # Parse the file, with the changes made since it was last saved
         try:
-            with open(file_name, "r", encoding="utf-8") as f:
-                return json.load(f)
+            metrics = PairingMetrics()
+            with metrics.span("parse"):
+                data = read_journaled_session(file_name)
+            self.file_name = file_name
+            self.load_metrics = metrics
+            return data
         except Exception as e:
             QMessageBox.critical(self, "Import Failed", f"Could not load file:\n{e}")
-            return None, None
+            return None
+
+    def recover_unsaved_session(self) -> dict:
+        # numbered, as several can be autosaved within the same second
+        labels = [f"{i}. " + time.strftime("Autosaved %Y-%m-%d %H:%M:%S", time.localtime(os.path.getmtime(file_name)))
+                  for i, file_name in enumerate(self.unsaved_sessions, 1)]
+        label, ok = QInputDialog.getItem(self, "Recover Unsaved Session", "Session:", labels, 0, False)
+        if not ok:
+            return
+        file_name = self.unsaved_sessions[labels.index(label)]
+        reply = QMessageBox.question(
+            self,
+            "Recover Unsaved Session",
+            f"Open this session, or discard it for good?\n{label}",
+            QMessageBox.StandardButton.Open | QMessageBox.StandardButton.Discard | QMessageBox.StandardButton.Cancel
+        )
+        if reply == QMessageBox.StandardButton.Discard:
+            os.remove(file_name)
+            self.unsaved_sessions.remove(file_name)
+            self.button_recover.setText(f"Recover unsaved ({len(self.unsaved_sessions)})")
+            self.button_recover.setVisible(bool(self.unsaved_sessions))
+            return
+        if reply != QMessageBox.StandardButton.Open:
+            return
+        try:
+            metrics = PairingMetrics()
+            with metrics.span("parse"):
+                data = read_session_file(file_name)
+            # keeps autosaving to the same file, until it's exported
+            self.unsaved_file = file_name
+            self.load_metrics = metrics
+            return data
+        except Exception as e:
+            QMessageBox.critical(self, "Recovery Failed", f"Could not load file:\n{e}")
+            return None
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Swiss Bracket Maker")
+    parser.add_argument("--matching-backend", choices=MATCHING_BACKEND_NAMES,
+                        help="matching algorithm to use, overrides the saved setting")
+    args, qt_args = parser.parse_known_args()
 
-    app = QtWidgets.QApplication([])
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+    # also names the folder unsaved sessions are autosaved to
+    app.setApplicationName("Swiss Bracket Maker")
 
     dialog = StartupDialog()
     dialog.exec()
 
     # Launch main window based on choice
     print(dialog.choice)
-    window = MainWindow(dialog.choice)
+    window = MainWindow(dialog.choice, dialog.file_name, dialog.load_metrics, dialog.unsaved_file)
+    if args.matching_backend:
+        window.settings.set_settings({"matching_backend": args.matching_backend})
 
 
 
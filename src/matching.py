@@ -0,0 +1,403 @@
+from collections import deque
+import numpy as np
+import networkx as nx
+
+
+def match_networkx(weights: np.ndarray, candidates: np.ndarray,
+                   initial: set[tuple[int, int]] | None = None) -> set[tuple[int, int]]:
+    """
+    Minimum weight maximum cardinality matching using networkx.
+    `candidates` is an (upper triangular) mask of which edges exist.
+    `initial` is a starting matching of weight 0 pairs for the backends that can
+    use one (see `DenseBlossom.solve`), networkx always starts from nothing.
+    """
+    rows, cols = np.nonzero(np.triu(candidates, k=1))
+    graph = nx.Graph()
+    graph.add_weighted_edges_from(zip(rows.tolist(), cols.tolist(), weights[rows, cols].tolist()))
+    return {(int(i), int(j)) for i, j in nx.min_weight_matching(graph)}
+
+
+def match_blossom(weights: np.ndarray, candidates: np.ndarray,
+                  initial: set[tuple[int, int]] | None = None) -> set[tuple[int, int]]:
+    """
+    Minimum weight maximum cardinality matching using the array based
+    blossom algorithm below, working directly on the weight matrix.
+    Starts from the pairs in `initial` that have the lowest weight.
+    """
+    n = len(weights)
+    candidates = np.triu(candidates, k=1)
+    candidates = candidates | candidates.T
+    if not candidates.any():
+        return set()
+
+    # turn it into a maximum weight matching where one extra edge always
+    # outweighs any difference in the weights of the others
+    max_weight = int(weights[candidates].max())
+    offset = (n // 2 + 1) * (max_weight + 1) + 1
+    # the offset doesn't fit the int32 weights, so the matrix for the blossom is always int64
+    blossom_weights = np.zeros((n, n), dtype=np.int64)
+    np.subtract(np.int64(offset), weights, out=blossom_weights, where=candidates)
+    blossom = DenseBlossom(blossom_weights)
+    return blossom.solve(initial)
+
+
+def match_scipy(weights: np.ndarray, candidates: np.ndarray,
+                initial: set[tuple[int, int]] | None = None) -> set[tuple[int, int]]:
+    """
+    Matching through SciPy's linear sum assignment.
+
+    The assignment of the symmetric weight matrix is a relaxation of the matching:
+    its cycles of length two are pairs, longer even cycles are split into their
+    cheaper half and the players left in odd cycles are matched with `match_blossom`.
+    Pairs that aren't candidates get a cost higher than any matching of candidates,
+    so the assignment only uses them if it has to.
+    Half the assignment cost is a lower bound, and if the result doesn't reach it
+    (or isn't a perfect matching of candidates) the whole problem is solved with
+    `match_blossom` instead, so the total weight is always the same as the other backends.
+    """
+    from scipy.optimize import linear_sum_assignment
+
+    n = len(weights)
+    candidates = np.triu(candidates, k=1)
+    candidates = candidates | candidates.T
+    if n < 2 or n % 2 or not candidates.any():
+        # the relaxation needs a perfect matching to be possible
+        return match_blossom(weights, candidates, initial)
+
+    cost = weights.astype(np.float64)
+    cost[~candidates] = (n // 2 + 1) * (float(weights[candidates].max()) + 1)
+    np.fill_diagonal(cost, np.inf)
+    rows, assigned = linear_sum_assignment(cost)
+    lower_bound = cost[rows, assigned].sum() / 2
+
+    matching = set()
+    leftover = []
+    seen = np.zeros(n, dtype=bool)
+    for start in range(n):
+        if seen[start]:
+            continue
+        cycle = []
+        node = start
+        while not seen[node]:
+            seen[node] = True
+            cycle.append(node)
+            node = assigned[node]
+        if len(cycle) % 2:
+            leftover.extend(cycle)
+            continue
+        # an even cycle splits into two matchings, take the cheaper one
+        halves = [[(cycle[i], cycle[(i + 1) % len(cycle)]) for i in range(offset, len(cycle), 2)] for offset in (0, 1)]
+        matching.update(min(halves, key=lambda half: sum(cost[i, j] for i, j in half)))
+
+    if leftover:
+        leftover = np.array(sorted(leftover))
+        sub_matching = match_blossom(weights[np.ix_(leftover, leftover)], candidates[np.ix_(leftover, leftover)])
+        matching.update((int(leftover[i]), int(leftover[j])) for i, j in sub_matching)
+
+    if 2 * len(matching) < n or not all(candidates[i, j] for i, j in matching):
+        print("Assignment gave no perfect matching of candidates, solving with blossom")
+        return match_blossom(weights, candidates, initial)
+    if sum(int(weights[i, j]) for i, j in matching) > lower_bound:
+        print("Assignment was not optimal, solving with blossom")
+        return match_blossom(weights, candidates, initial)
+    return {(int(i), int(j)) for i, j in matching}
+
+
+MATCHING_BACKENDS = {
+    "networkx": match_networkx,
+    "blossom": match_blossom,
+    "scipy": match_scipy,
+}
+
+
+class DenseBlossom():
+    """
+    O(n^3) maximum weight matching (Edmonds' blossom algorithm with dual variables)
+    on a dense matrix of positive integer weights, where 0 means no edge.
+
+    Vertices are 1..n and blossoms n+1..2n, with 0 meaning "none".
+    Every pair of (super)vertices keeps the best original edge between them
+    in `edge_u`, `edge_v` and `edge_w`, so the scans over all vertices can be done
+    with NumPy instead of looping in Python.
+    The vertex arrays are int32 to halve the memory of the (2n+1)^2 matrices,
+    only the weights need int64.
+    """
+    def __init__(self, weights: np.ndarray):
+        n = len(weights)
+        size = 2 * n + 1
+        self.n = n
+        self.n_x = n
+
+        index = np.arange(size, dtype=np.int64)
+        self.edge_u = np.repeat(index[:, None].astype(np.int32), size, axis=1)
+        self.edge_v = np.repeat(index[None, :].astype(np.int32), size, axis=0)
+        self.edge_w = np.zeros((size, size), dtype=np.int64)
+        self.edge_w[1:n+1, 1:n+1] = weights
+
+        self.lab = np.zeros(size, dtype=np.int64)
+        self.match = np.zeros(size, dtype=np.int64)
+        self.slack = np.zeros(size, dtype=np.int64)
+        self.st = index.copy()
+        self.pa = np.zeros(size, dtype=np.int64)
+        self.S = np.full(size, -1, dtype=np.int64)
+        self.vis = np.zeros(size, dtype=np.int64)
+        self.vis_time = 0
+        self.flower: list[list[int]] = [[] for _ in range(size)]
+        self.flower_from = np.zeros((size, n + 1), dtype=np.int32)
+        self.flower_from[np.arange(1, n + 1), np.arange(1, n + 1)] = np.arange(1, n + 1)
+        self.queue = deque()
+
+    def solve(self, initial: set[tuple[int, int]] | None = None) -> set[tuple[int, int]]:
+        """
+        Returns the matching as (i, j) pairs of 0-based indices into the weight matrix.
+
+        The pairs in `initial` with the highest weight are matched up front:
+        those edges are tight with the starting dual variables, so the algorithm
+        holds and only has to augment the vertices that are left, one phase each.
+        """
+        n = self.n
+        max_weight = self.edge_w.max()
+        self.lab[1:n+1] = max_weight
+        for i, j in initial or ():
+            u, v = i + 1, j + 1
+            if self.edge_w[u, v] == max_weight and not self.match[u] and not self.match[v]:
+                self.match[u] = v
+                self.match[v] = u
+        while self.augment_matching():
+            pass
+        return {(u - 1, int(self.match[u]) - 1) for u in range(1, n + 1) if self.match[u] and self.match[u] > u}
+
+    def e_delta(self, u, v):
+        return self.lab[self.edge_u[u, v]] + self.lab[self.edge_v[u, v]] - 2 * self.edge_w[u, v]
+
+    def update_slack(self, u: int, x: int):
+        if not self.slack[x] or self.e_delta(u, x) < self.e_delta(self.slack[x], x):
+            self.slack[x] = u
+
+    def set_slack(self, x: int):
+        n = self.n
+        self.slack[x] = 0
+        vertices = np.arange(1, n + 1)
+        st = self.st[1:n+1]
+        mask = (self.edge_w[1:n+1, x] > 0) & (st != x) & (self.S[st] == 0)
+        if mask.any():
+            vertices = vertices[mask]
+            self.slack[x] = vertices[np.argmin(self.e_delta(vertices, x))]
+
+    def q_push(self, x: int):
+        if x <= self.n:
+            self.queue.append(x)
+        else:
+            for child in self.flower[x]:
+                self.q_push(child)
+
+    def set_st(self, x: int, b: int):
+        self.st[x] = b
+        if x > self.n:
+            for child in self.flower[x]:
+                self.set_st(child, b)
+
+    def get_pr(self, b: int, xr: int) -> int:
+        flower = self.flower[b]
+        pr = flower.index(xr)
+        if pr % 2:
+            flower[1:] = flower[:0:-1]
+            return len(flower) - pr
+        return pr
+
+    def set_match(self, u: int, v: int):
+        self.match[u] = self.edge_v[u, v]
+        if u > self.n:
+            xr = int(self.flower_from[u, self.edge_u[u, v]])
+            pr = self.get_pr(u, xr)
+            flower = self.flower[u]
+            for i in range(pr):
+                self.set_match(flower[i], flower[i ^ 1])
+            self.set_match(xr, v)
+            self.flower[u] = flower[pr:] + flower[:pr]
+
+    def augment(self, u: int, v: int):
+        while True:
+            xnv = int(self.st[self.match[u]])
+            self.set_match(u, v)
+            if not xnv:
+                return
+            self.set_match(xnv, int(self.st[self.pa[xnv]]))
+            u, v = int(self.st[self.pa[xnv]]), xnv
+
+    def get_lca(self, u: int, v: int) -> int:
+        self.vis_time += 1
+        while u or v:
+            if u:
+                if self.vis[u] == self.vis_time:
+                    return u
+                self.vis[u] = self.vis_time
+                u = int(self.st[self.match[u]])
+                if u:
+                    u = int(self.st[self.pa[u]])
+            u, v = v, u
+        return 0
+
+    def add_blossom(self, u: int, lca: int, v: int):
+        n = self.n
+        b = n + 1
+        while b <= self.n_x and self.st[b]:
+            b += 1
+        if b > self.n_x:
+            self.n_x += 1
+        self.lab[b] = 0
+        self.S[b] = 0
+        self.match[b] = self.match[lca]
+
+        flower = [lca]
+        x = u
+        while x != lca:
+            y = int(self.st[self.match[x]])
+            flower += [x, y]
+            self.q_push(y)
+            x = int(self.st[self.pa[y]])
+        flower[1:] = flower[:0:-1]
+        x = v
+        while x != lca:
+            y = int(self.st[self.match[x]])
+            flower += [x, y]
+            self.q_push(y)
+            x = int(self.st[self.pa[y]])
+        self.flower[b] = flower
+        self.set_st(b, b)
+
+        others = np.arange(1, self.n_x + 1)
+        self.edge_w[b, others] = 0
+        self.edge_w[others, b] = 0
+        self.flower_from[b, 1:] = 0
+        for xs in flower:
+            better = (self.edge_w[b, others] == 0) | (self.e_delta(xs, others) < self.e_delta(b, others))
+            chosen = others[better]
+            for edge in (self.edge_u, self.edge_v, self.edge_w):
+                edge[b, chosen] = edge[xs, chosen]
+                edge[chosen, b] = edge[chosen, xs]
+            self.flower_from[b, 1:][self.flower_from[xs, 1:] != 0] = xs
+        self.set_slack(b)
+
+    def expand_blossom(self, b: int):
+        for x in self.flower[b]:
+            self.set_st(x, x)
+        xr = int(self.flower_from[b, self.edge_u[b, self.pa[b]]])
+        pr = self.get_pr(b, xr)
+        flower = self.flower[b]
+        for i in range(0, pr, 2):
+            xs, xns = flower[i], flower[i + 1]
+            self.pa[xs] = self.edge_u[xns, xs]
+            self.S[xs] = 1
+            self.S[xns] = 0
+            self.slack[xs] = 0
+            self.set_slack(xns)
+            self.q_push(xns)
+        self.S[xr] = 1
+        self.pa[xr] = self.pa[b]
+        for xs in flower[pr + 1:]:
+            self.S[xs] = -1
+            self.set_slack(xs)
+        self.st[b] = 0
+
+    def on_found_edge(self, eu: int, ev: int) -> bool:
+        u, v = int(self.st[eu]), int(self.st[ev])
+        if self.S[v] == -1:
+            self.pa[v] = eu
+            self.S[v] = 1
+            nu = int(self.st[self.match[v]])
+            self.slack[v] = self.slack[nu] = 0
+            self.S[nu] = 0
+            self.q_push(nu)
+        elif self.S[v] == 0:
+            lca = self.get_lca(u, v)
+            if not lca:
+                self.augment(u, v)
+                self.augment(v, u)
+                return True
+            self.add_blossom(u, lca, v)
+        return False
+
+    def augment_matching(self) -> bool:
+        """
+        One phase of the algorithm: grow alternating trees and adjust the
+        dual variables until an augmenting path is found.
+        """
+        n = self.n
+        self.S[1:self.n_x+1] = -1
+        self.slack[1:self.n_x+1] = 0
+        self.queue = deque()
+        for x in range(1, self.n_x + 1):
+            if self.st[x] == x and not self.match[x]:
+                self.pa[x] = 0
+                self.S[x] = 0
+                self.q_push(x)
+        if not self.queue:
+            return False
+
+        vertices = np.arange(1, n + 1)
+        while True:
+            while self.queue:
+                u = self.queue.popleft()
+                if self.S[self.st[u]] == 1:
+                    continue
+                neighbours = vertices[(self.edge_w[u, 1:n+1] > 0) & (self.st[1:n+1] != self.st[u])]
+                deltas = self.e_delta(u, neighbours)
+                for v in neighbours[deltas == 0].tolist():
+                    if self.st[u] != self.st[v] and self.on_found_edge(int(self.edge_u[u, v]), int(self.edge_v[u, v])):
+                        return True
+                rest = neighbours[deltas != 0]
+                blossoms = np.unique(self.st[rest[self.st[rest] != self.st[u]]])
+                if len(blossoms):
+                    current = self.slack[blossoms]
+                    better = (current == 0) | (self.e_delta(u, blossoms) < self.e_delta(current, blossoms))
+                    self.slack[blossoms[better]] = u
+
+            d = None
+            tops = np.arange(1, self.n_x + 1)
+            tops = tops[self.st[tops] == tops]
+            s_blossoms = tops[(tops > n) & (self.S[tops] == 1)]
+            if len(s_blossoms):
+                d = int((self.lab[s_blossoms] // 2).min())
+            with_slack = tops[self.slack[tops] != 0]
+            if len(with_slack):
+                deltas = self.e_delta(self.slack[with_slack], with_slack)
+                states = self.S[with_slack]
+                for candidate in (deltas[states == -1], deltas[states == 0] // 2):
+                    if len(candidate):
+                        d = int(candidate.min()) if d is None else min(d, int(candidate.min()))
+            if d is None:
+                return False
+
+            states = self.S[self.st[1:n+1]]
+            labels = self.lab[1:n+1]
+            if (labels[states == 0] <= d).any():
+                return False
+            labels[states == 0] -= d
+            labels[states == 1] += d
+            blossom_tops = tops[tops > n]
+            self.lab[blossom_tops[self.S[blossom_tops] == 0]] += 2 * d
+            self.lab[blossom_tops[self.S[blossom_tops] == 1]] -= 2 * d
+
+            # the checks below change the state as they go, so candidates
+            # after the one being handled are looked up again every time
+            self.queue = deque()
+            x = 0
+            while True:
+                tops = np.arange(x + 1, self.n_x + 1)
+                tops = tops[(self.st[tops] == tops) & (self.slack[tops] != 0)]
+                tops = tops[self.st[self.slack[tops]] != tops]
+                tops = tops[self.e_delta(self.slack[tops], tops) == 0]
+                if not len(tops):
+                    break
+                x = int(tops[0])
+                if self.on_found_edge(int(self.edge_u[self.slack[x], x]), int(self.edge_v[self.slack[x], x])):
+                    return True
+            b = n
+            while True:
+                tops = np.arange(b + 1, self.n_x + 1)
+                tops = tops[(self.st[tops] == tops) & (self.S[tops] == 1) & (self.lab[tops] == 0)]
+                if not len(tops):
+                    break
+                b = int(tops[0])
+                self.expand_blossom(b)
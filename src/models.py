@@ -0,0 +1,287 @@
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt, Signal
+from PySide6.QtGui import QColor
+from PySide6.QtWidgets import QComboBox, QStyledItemDelegate
+from classes import *
+
+
+class RoundTableModel(QAbstractTableModel):
+    """
+    The matchups of one round as a table, for a QTableView.
+    Nothing is created per row, the view only asks for what's visible.
+
+    Scores and notes are edited on the `Matchup`s directly. Picking a winner is only
+    passed on with `winner_selected`, as what it means for the scores is up to the
+    window, which then calls `refresh_matchup` to update that one row.
+
+    Rows are always in the round's order, sorting is left to a proxy in front,
+    so the row of each matchup can be looked up once and stays valid.
+    """
+    HEADERS = ["P1", "P2", "Winner", "P1Score", "P2Score", "Notes"]
+    PLAYER1, PLAYER2, WINNER, SCORE1, SCORE2, NOTES = range(6)
+
+    # matchup, winner
+    winner_selected = Signal(object, str)
+    # matchup, after its scores or notes were edited
+    matchup_edited = Signal(object)
+
+    def __init__(self, round: Round, round_index: int, parent=None):
+        super().__init__(parent)
+        self.round = round
+        self.round_index = round_index
+        # id(matchup) -> row
+        self.matchup_rows = {id(matchup): row for row, matchup in enumerate(round.matchups)}
+
+    @staticmethod
+    def winner_options(matchup: Matchup) -> list[str]:
+        options = [matchup.player1]
+        if matchup.player2:
+            options.append(matchup.player2)
+        return options + ["No Winner", "Delayed"]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.round.matchups)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return section + 1
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        matchup = self.round.matchups[index.row()]
+        column = index.column()
+
+        if role == Qt.ItemDataRole.UserRole:
+            return matchup
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            if column == self.PLAYER1:
+                return matchup.player1
+            if column == self.PLAYER2:
+                return matchup.player2 or ""
+            if column == self.WINNER:
+                if not matchup.winner and role == Qt.ItemDataRole.DisplayRole:
+                    return "Select winner..."
+                return matchup.winner or ""
+            if column == self.SCORE1:
+                return matchup.score_player1
+            if column == self.SCORE2:
+                return matchup.score_player2
+            if column == self.NOTES:
+                return str(matchup.notes)
+        if role == Qt.ItemDataRole.ForegroundRole and column == self.WINNER and not matchup.winner:
+            return QColor(Qt.GlobalColor.gray)
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        # name columns should not be editable
+        if index.isValid() and index.column() not in (self.PLAYER1, self.PLAYER2):
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        matchup = self.round.matchups[index.row()]
+        column = index.column()
+
+        if column == self.WINNER:
+            if value == matchup.winner or value not in self.winner_options(matchup):
+                return False
+            self.winner_selected.emit(matchup, value)
+            return True
+
+        if column in (self.SCORE1, self.SCORE2):
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return False
+            if column == self.SCORE1:
+                matchup.score_player1 = value
+                print(f"Updated p1 score in {matchup} to {value}")
+            else:
+                matchup.score_player2 = value
+                print(f"Updated p2 score in {matchup} to {value}")
+        elif column == self.NOTES:
+            matchup.notes = str(value)
+            print(f"Updated notes in {matchup} to {value}")
+        else:
+            return False
+        self.dataChanged.emit(index, index)
+        self.matchup_edited.emit(matchup)
+        return True
+
+    def row_of(self, matchup: Matchup) -> int:
+        """
+        The model row of `matchup`, -1 if it's not in this round. Use the proxy's
+        `mapFromSource` for where it is in the (maybe sorted) view.
+        """
+        row = self.matchup_rows.get(id(matchup), -1)
+        # ids can be reused once a matchup is gone, so make sure it's the same one
+        if row != -1 and self.round.matchups[row] is not matchup:
+            return -1
+        return row
+
+    def refresh_matchup(self, matchup: Matchup):
+        """
+        Tells the view the winner and scores of `matchup` changed.
+        """
+        row = self.row_of(matchup)
+        if row == -1:
+            print("Error: matchup row to be updated not found")
+            return
+        self.dataChanged.emit(self.index(row, self.WINNER), self.index(row, self.SCORE2))
+
+    def refresh_results(self):
+        """
+        Tells the view the winners and scores of any matchup may have changed, after a bulk update.
+        """
+        if self.round.matchups:
+            self.dataChanged.emit(self.index(0, self.WINNER), self.index(len(self.round.matchups) - 1, self.SCORE2))
+
+
+class WinnerDelegate(QStyledItemDelegate):
+    """
+    Edits the winner column with a combo box of both players, "No Winner" and "Delayed".
+    The combo box only exists while a cell is being edited.
+    """
+    def createEditor(self, parent, option, index):
+        combo = QComboBox(parent)
+        combo.addItems(RoundTableModel.winner_options(index.data(Qt.ItemDataRole.UserRole)))
+        # picking one is enough, like with the old combo boxes
+        combo.activated.connect(lambda _, combo=combo: self.commit(combo))
+        return combo
+
+    def setEditorData(self, editor, index):
+        editor.setCurrentIndex(editor.findText(index.data(Qt.ItemDataRole.EditRole)))
+
+    def setModelData(self, editor, model, index):
+        if editor.currentIndex() >= 0:
+            model.setData(index, editor.currentText(), Qt.ItemDataRole.EditRole)
+
+    def commit(self, combo: QComboBox):
+        self.commitData.emit(combo)
+        self.closeEditor.emit(combo)
+
+
+class PlayersTableModel(QAbstractTableModel):
+    """
+    The standings, one row per player in the order they were added, for a QTableView
+    behind a sort proxy. `update` takes the stats engine's output and only
+    tells the view about the rows whose drop state, score, resistance or win percentage changed.
+    """
+    HEADERS = ["Drop", "Name", "Score", "Resistance", "Win Percentage"]
+    DROP, NAME, SCORE, RESISTANCE, WIN_PERCENTAGE = range(5)
+
+    # player, after the drop checkbox was clicked
+    player_dropped = Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows: list[PlayerInfo] = []
+        # what each row shows, to find the ones that changed
+        self.shown: list[tuple] = []
+
+    @staticmethod
+    def win_percentage(player_info: PlayerInfo) -> float:
+        if player_info.n_played:
+            return round(player_info.n_wins / player_info.n_played * 100, 2)
+        return 0
+
+    @staticmethod
+    def shown_values(player_info: PlayerInfo) -> tuple:
+        return (player_info.player.dropped, player_info.score, round(player_info.resistance, 2),
+                PlayersTableModel.win_percentage(player_info))
+
+    def update(self, player_info_list: list[PlayerInfo]):
+        shown = [self.shown_values(player_info) for player_info in player_info_list]
+        n_rows = len(self.rows)
+        same_players = len(player_info_list) >= n_rows and all(
+            new.player is old.player for new, old in zip(player_info_list, self.rows))
+        if not same_players:
+            # players were removed or replaced, e.g. by importing a session
+            self.beginResetModel()
+            self.rows, self.shown = player_info_list, shown
+            self.endResetModel()
+            return
+
+        # one dataChanged per run of changed rows
+        changed = [row for row in range(n_rows) if shown[row] != self.shown[row]]
+        self.rows[:n_rows], self.shown[:n_rows] = player_info_list[:n_rows], shown[:n_rows]
+        start = 0
+        for i in range(1, len(changed) + 1):
+            if i == len(changed) or changed[i] != changed[i - 1] + 1:
+                self.dataChanged.emit(self.index(changed[start], 0), self.index(changed[i - 1], len(self.HEADERS) - 1))
+                start = i
+
+        # new players go at the end
+        if len(player_info_list) > n_rows:
+            self.beginInsertRows(QModelIndex(), n_rows, len(player_info_list) - 1)
+            self.rows += player_info_list[n_rows:]
+            self.shown += shown[n_rows:]
+            self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return section + 1
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        dropped, score, resistance, win_percentage = self.shown[index.row()]
+        column = index.column()
+
+        if column == self.DROP:
+            if role == Qt.ItemDataRole.CheckStateRole:
+                return Qt.CheckState.Checked if dropped else Qt.CheckState.Unchecked
+            if role == Qt.ItemDataRole.EditRole:
+                # for sorting
+                return int(dropped)
+            return None
+        if role == Qt.ItemDataRole.EditRole:
+            # numbers, so the proxy sorts 100 above 50
+            return (None, self.rows[index.row()].player.name, score, resistance, win_percentage)[column]
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == self.NAME:
+                return self.rows[index.row()].player.name
+            if column == self.SCORE:
+                return score
+            if column == self.RESISTANCE:
+                return f"{resistance}"
+            if column == self.WIN_PERCENTAGE:
+                return f"{win_percentage}%"
+        if role == Qt.ItemDataRole.TextAlignmentRole and column != self.NAME:
+            return Qt.AlignmentFlag.AlignCenter
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == self.DROP:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or index.column() != self.DROP or role != Qt.ItemDataRole.CheckStateRole:
+            return False
+        player_info = self.rows[index.row()]
+        player_info.player.dropped = Qt.CheckState(value) == Qt.CheckState.Checked
+        print(f"{player_info.player.name} is now {'dropped' if player_info.player.dropped else 'active'}.")
+        self.shown[index.row()] = self.shown_values(player_info)
+        self.dataChanged.emit(index, index)
+        self.player_dropped.emit(player_info.player)
+        return True
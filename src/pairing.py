@@ -0,0 +1,914 @@
+"""
+The pairing core: round generation, player stats and brackets.
+Doesn't depend on any GUI code, and the heavy dependencies (numpy, networkx)
+are only imported once they are needed, so it can be used headless and starts quickly.
+"""
+from __future__ import annotations
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import TYPE_CHECKING, Callable
+import multiprocessing
+import os
+import time
+from classes import *
+from instrumentation import PairingMetrics
+import math
+import random
+
+if TYPE_CHECKING:
+    import numpy as np
+    from stats import StatsEngine
+
+
+# same names as matching.MATCHING_BACKENDS, not imported from there to keep startup light
+MATCHING_BACKEND_NAMES = ["networkx", "blossom", "scipy"]
+
+# False in processes that shouldn't start any of their own, see `use_single_process`
+_processes_allowed = True
+
+
+def use_single_process():
+    """
+    Makes all pairing in this process happen in it: seeds and score blocks are paired
+    one after the other, and with a deadline only the greedy pairing and swaps are done.
+    For the workers of a process pool whose size should bound the CPU use, like the service's.
+    """
+    global _processes_allowed
+    _processes_allowed = False
+
+
+def processes_allowed() -> bool:
+    # daemonic processes (e.g. of a multiprocessing.Pool) can't start processes anyway
+    return _processes_allowed and not multiprocessing.current_process().daemon
+
+
+class PairingSettings():
+    """
+    Plain settings for round generation, without the settings dialog.
+    `SettingsDialog` has the same attributes so either can be passed.
+    """
+    p1_ext_point = 1.0
+    p2_ext_point = 0.0
+    random_ext_point_assignment = True
+    pairing_window = 2
+    matching_backend = "networkx"
+    profile_pairing = False
+    pairing_seeds = 1
+    # seconds round generation may take, 0 for no limit
+    pairing_deadline = 0.0
+    # players per independently matched score block, 0 for one block
+    pairing_block_size = 0
+
+    def __init__(self, settings: dict | None = None):
+        """
+        Settings not in the dict keep their defaults, like `SettingsDialog.set_settings`
+        """
+        for key, value in (settings or {}).items():
+            if hasattr(PairingSettings, key):
+                setattr(self, key, value)
+        # a window of 0 would never widen when there's no perfect matching in it
+        if self.pairing_window is not None and self.pairing_window < 1:
+            raise ValueError(f"Pairing window must be at least 1, not {self.pairing_window}")
+
+    @classmethod
+    def from_settings(cls, settings) -> PairingSettings:
+        """
+        A plain copy of `settings` (for example the settings dialog),
+        which can be pickled and doesn't change along with the original.
+        """
+        return cls({key: getattr(settings, key) for key in cls().to_dict()})
+
+    def to_dict(self) -> dict:
+        return {
+            "p1_ext_point": self.p1_ext_point,
+            "p2_ext_point": self.p2_ext_point,
+            "random_ext_point_assignment": self.random_ext_point_assignment,
+            "pairing_window": self.pairing_window,
+            "matching_backend": self.matching_backend,
+            "profile_pairing": self.profile_pairing,
+            "pairing_seeds": self.pairing_seeds,
+            "pairing_deadline": self.pairing_deadline,
+            "pairing_block_size": self.pairing_block_size,
+        }
+
+
+def generate_matchups(players: list[Player], rounds: list[Round], settings: PairingSettings,
+                      history: OpponentHistory | None = None, stats: StatsEngine | None = None,
+                      metrics: PairingMetrics | None = None, deadline: float | None = None) -> list[Matchup]:
+    """
+    Generate matchups by maximum weight matching, applying a penalty
+    to up and down pairing, and various undesirable pairings.
+    Undesirable here is matching a BYE with a player not at the bottom
+    of the standings, matching players who have already played each other,
+    and up/down pairing a player who's already been up/down paired previously.
+
+    Randomness seeded with the sorted names of players and round number
+    to attempt to make it reproducible and non-manipulable.
+    With `settings.pairing_seeds` above 1 several seeds are tried in parallel
+    and the cheapest pairing is kept, see `search_seeds`.
+
+    A fast score group pairing is tried first, the matching is only
+    used as a fallback when that one can't produce a valid pairing.
+
+    Pass the tournament's `history` and `stats` if they're kept up to date,
+    otherwise they're rebuilt from the rounds.
+    Timings and counters of every step are recorded in `metrics`, if given,
+    including the total weight of the pairing ("cost"), whether it's proven optimal
+    and whether the deadline cut it short ("deadline_reached").
+
+    With a `deadline` (in seconds, `settings.pairing_deadline` by default) the pairing
+    is done within about that time, see `pair_before_deadline`.
+    """
+    if metrics is None:
+        metrics = PairingMetrics()
+    if deadline is None:
+        deadline = settings.pairing_deadline
+    # as an absolute time, so it can be passed on to other processes
+    deadline_at = time.monotonic() + deadline if deadline else None
+    with metrics.capture():
+        start = time.time()
+
+        print("Calculating necessary stats")
+        with metrics.span("stats"):
+            if stats is not None:
+                player_info_list = stats.get_stats(len(rounds))
+            else:
+                player_info_list = calculate_players_stats(players, rounds, history=history)
+        player_info_list_in_round = [player for player in player_info_list if not player.player.dropped]
+        metrics.count("players", len(player_info_list_in_round))
+
+        seed = "".join([player.player.name for player in player_info_list_in_round])
+        seed += str(len(rounds))
+
+        # all matchups that already happened, because those can't happen again
+        already_played = history if history is not None else OpponentHistory(rounds)
+        if len(player_info_list_in_round) % 2:
+            metrics.count("bye_candidates", sum((None, p.player.name) not in already_played for p in player_info_list_in_round))
+
+        n_seeds = max(1, settings.pairing_seeds)
+        if n_seeds > 1 and not (settings.random_ext_point_assignment
+                                and any(m.winner == "Delayed" for r in rounds for m in r.matchups)):
+            # the seeds only differ in the delay coin flips, without those every seed
+            # gets the same scores and so the same (optimal) cost
+            n_seeds = 1
+        if n_seeds == 1:
+            matching, cost, optimal, deadline_reached = pair_with_seed(player_info_list_in_round, rounds, settings,
+                                                                       already_played, seed, metrics, deadline_at)
+        else:
+            with metrics.span("seed_search"):
+                matching, cost, optimal, deadline_reached, best_seed = search_seeds(
+                    player_info_list_in_round, rounds, settings, already_played, seed, n_seeds, deadline_at)
+            metrics.count("seeds", n_seeds)
+            metrics.count("best_seed", best_seed)
+        metrics.count("cost", cost)
+        metrics.count("optimal", optimal)
+        metrics.count("deadline_reached", deadline_reached)
+
+        # sort by score because that's nice
+        def _get_match_score_for_sorting(match: tuple[PlayerInfo|str]):
+            if "BYE" in match:
+                return (0, "", "")
+            else:
+                score = match[0].score + match[1].score + 0.5 * (match[0].active_delays + match[1].active_delays)
+                return (-score, match[0].player.name, match[1].player.name)
+
+        # first score, then alphabetical
+        with metrics.span("sorting"):
+            matching = sorted(matching, key=_get_match_score_for_sorting)
+
+            matchups: list[Matchup] = []
+            for matchup in matching:
+                if "BYE" in matchup:
+                    bye_player = matchup[1] if matchup[0] == "BYE" else matchup[0]
+                    matchups.append(Matchup(bye_player.player.name, None, "BYE"))
+                    continue
+                matchups.append(Matchup(matchup[0].player.name, matchup[1].player.name))
+        print(f"Matchup generation took {time.time() - start} seconds")
+        return matchups
+
+
+def pair_with_seed(player_info_list_in_round: list[PlayerInfo], rounds: list[Round], settings: PairingSettings,
+                   already_played: OpponentHistory, seed: str, metrics: PairingMetrics | None = None,
+                   deadline_at: float | None = None) -> tuple[set[tuple[PlayerInfo|str]], int, bool, bool]:
+    """
+    Pairs the players once with the randomness seeded from `seed`, returning the pairing,
+    its total weight, whether it's proven optimal and whether the deadline was reached.
+    `deadline_at` is a `time.monotonic()` time to be done by.
+    """
+    if metrics is None:
+        metrics = PairingMetrics()
+
+    # our own generator instead of the global one, so a pairing running at the same
+    # time in another thread (e.g. a cancelled one) can't change this one's coin flips
+    rng = random.Random(seed)
+    # the matching backends are deterministic, this draw used to seed np.random and
+    # is kept so the same seed still gives the same pairing as before
+    rng.randint(0, 2**32-1)
+
+    # get scores incorporating randomly assigning delayed games' winners
+    with metrics.span("delay_resolution"):
+        player_info_effective_scores = get_scores_for_round_generation(player_info_list_in_round, rounds, settings, rng)
+
+    player_info_list_in_round = list(player_info_list_in_round)
+    rng.shuffle(player_info_list_in_round)
+
+    integer_scores = assign_integer_scores(player_info_effective_scores)
+
+    print("Trying score group pairing")
+    with metrics.span("score_group_pairing"):
+        matching = pair_by_score_groups(player_info_list_in_round, integer_scores, already_played)
+    metrics.count("fallback", matching is None)
+    # matching in score blocks or within a window gives up the guarantee, though the pairing rarely differs
+    levels = set(integer_scores.values())
+    windowed = settings.pairing_window is not None and len(levels) > 1 and settings.pairing_window < max(levels) - min(levels)
+    blocks = 0 < settings.pairing_block_size < len(player_info_list_in_round)
+    optimal = matching is not None or not (windowed or blocks)
+    deadline_reached = False
+    if matching is None and deadline_at is not None:
+        print("Score group pairing failed, pairing before the deadline")
+        matching, finished = pair_before_deadline(player_info_list_in_round, integer_scores, already_played, settings,
+                                                  deadline_at, metrics)
+        optimal = optimal and finished
+        deadline_reached = not finished
+    elif matching is None:
+        print("Score group pairing failed, falling back to optimal matching")
+        matching = find_block_matching(player_info_list_in_round, integer_scores, already_played, settings.pairing_block_size,
+                                       settings.pairing_window, settings.matching_backend, metrics)
+    return matching, get_total_weight(matching, integer_scores, already_played), optimal, deadline_reached
+
+
+def search_seeds(player_info_list_in_round: list[PlayerInfo], rounds: list[Round], settings: PairingSettings,
+                 already_played: OpponentHistory, seed: str, n_seeds: int,
+                 deadline_at: float | None = None) -> tuple[set[tuple[PlayerInfo|str]], int, bool, bool, int]:
+    """
+    Pairs the players with `n_seeds` seeds derived from `seed` in a process pool, and returns
+    the cheapest pairing, its weight, whether it's proven optimal, whether the deadline
+    was reached and which seed it was.
+    Seed 0 is `seed` itself, so the result is never worse than a single run,
+    and ties go to the lowest seed so it's still reproducible.
+    """
+    # the settings dialog can't be pickled, and the workers only need the delayed games
+    settings = PairingSettings.from_settings(settings)
+    delayed_rounds = [Round([m for m in r.matchups if m.winner == "Delayed"]) for r in rounds]
+    seeds = [seed] + [f"{seed}-{i}" for i in range(1, n_seeds)]
+
+    print(f"Pairing with {n_seeds} seeds")
+    arguments = (repeat(player_info_list_in_round), repeat(delayed_rounds), repeat(settings), repeat(already_played),
+                 seeds, repeat(None), repeat(deadline_at))
+    if not processes_allowed():
+        results = list(map(pair_with_seed, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_seeds, os.cpu_count() or 1)) as executor:
+            results = list(executor.map(pair_with_seed, *arguments))
+    best_seed = min(range(n_seeds), key=lambda i: (results[i][1], i))
+    print(f"Pairing costs per seed: {[cost for _, cost, _, _ in results]}")
+    matching, cost, optimal, deadline_reached = results[best_seed]
+    return matching, cost, optimal, deadline_reached, best_seed
+
+
+def pair_before_deadline(player_info_list_in_round: list[PlayerInfo], integer_scores: dict[PlayerInfo, int],
+                         already_played: OpponentHistory, settings: PairingSettings, deadline_at: float,
+                         metrics: PairingMetrics | None = None) -> tuple[set[tuple[PlayerInfo|str]], bool]:
+    """
+    Anytime pairing for when the next round has to be out by `deadline_at` (a `time.monotonic()` time).
+
+    The optimal matching is started in a separate process, while here a greedy pairing
+    is made and improved with swaps. Whichever is there at the deadline is used:
+    the optimal matching if it finished, the best pairing found so far otherwise,
+    in which case the process is stopped. Returns the pairing and whether the matching finished in time.
+    Without other processes (see `use_single_process`) only the greedy pairing and swaps are done.
+    """
+    if metrics is None:
+        metrics = PairingMetrics()
+
+    if not processes_allowed():
+        with metrics.span("greedy"):
+            matching = pair_greedily(player_info_list_in_round, integer_scores, already_played)
+        with metrics.span("local_search"):
+            matching = improve_by_swaps(matching, integer_scores, already_played, lambda: time.monotonic() >= deadline_at)
+        return set(matching), False
+
+    # a process can be stopped at the deadline, unlike a thread
+    pool = multiprocessing.Pool(1)
+    try:
+        exact = pool.apply_async(find_block_matching, (player_info_list_in_round, integer_scores, already_played,
+                                                       settings.pairing_block_size, settings.pairing_window,
+                                                       settings.matching_backend))
+        with metrics.span("greedy"):
+            matching = pair_greedily(player_info_list_in_round, integer_scores, already_played)
+        with metrics.span("local_search"):
+            matching = improve_by_swaps(matching, integer_scores, already_played,
+                                        lambda: exact.ready() or time.monotonic() >= deadline_at)
+
+        exact.wait(max(0., deadline_at - time.monotonic()))
+        if exact.ready() and exact.successful():
+            # the other process sends back copies, use our own players
+            player_infos = {player_info.player.name: player_info for player_info in player_info_list_in_round}
+            return {tuple(p if p == "BYE" else player_infos[p.player.name] for p in pair) for pair in exact.get()}, True
+        print("Deadline reached, using the best pairing found so far")
+        return set(matching), False
+    finally:
+        pool.terminate()
+
+
+def pair_greedily(player_info_list_in_round: list[PlayerInfo], integer_scores: dict[PlayerInfo, int],
+                  already_played: OpponentHistory) -> list[tuple[PlayerInfo|str]]:
+    """
+    Quick pairing that's always complete: from the top of the standings down,
+    everyone gets the next player that isn't a rematch (or the next player at all
+    if there is none). The BYE goes to the lowest player without one.
+    """
+    standings = sorted(player_info_list_in_round, key=lambda p: integer_scores[p], reverse=True)
+    matching = []
+    if len(standings) % 2:
+        bye_player = next((p for p in reversed(standings) if (None, p.player.name) not in already_played), standings[-1])
+        standings.remove(bye_player)
+        matching.append((bye_player, "BYE"))
+
+    paired = set()
+    for i, player_info in enumerate(standings):
+        if player_info.player.name in paired:
+            continue
+        candidates = [p for p in standings[i+1:i+64] if p.player.name not in paired]
+        if not candidates:
+            # far down the list because of a long run of paired players
+            candidates = [p for p in standings[i+1:] if p.player.name not in paired]
+        opponent = next((p for p in candidates if (player_info.player.name, p.player.name) not in already_played), candidates[0])
+        paired.update((player_info.player.name, opponent.player.name))
+        matching.append((player_info, opponent))
+    return matching
+
+
+def improve_by_swaps(matching: list[tuple[PlayerInfo|str]], integer_scores: dict[PlayerInfo, int],
+                     already_played: OpponentHistory, should_stop: Callable[[], bool],
+                     neighbourhood: int = 8) -> list[tuple[PlayerInfo|str]]:
+    """
+    Local search on a complete pairing: for two pairs (a, b) and (c, d) close together
+    in the standings, tries (a, c), (b, d) and (a, d), (b, c) instead and keeps
+    whichever is cheaper. Goes over the pairing until nothing improves or `should_stop`.
+    """
+    pairs = sorted(matching, key=lambda pair: -sum(integer_scores[p] for p in pair if p != "BYE"))
+    weights = [get_pair_weight(*pair, integer_scores, already_played) for pair in pairs]
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(pairs)):
+            if not weights[i]:
+                continue
+            if should_stop():
+                return pairs
+            for j in range(max(0, i - neighbourhood), min(len(pairs), i + neighbourhood + 1)):
+                if j == i:
+                    continue
+                a, b = pairs[i]
+                c, d = pairs[j]
+                for new_i, new_j in (((a, c), (b, d)), ((a, d), (b, c))):
+                    if "BYE" in new_i and "BYE" in new_j:
+                        continue
+                    new_weights = (get_pair_weight(*new_i, integer_scores, already_played),
+                                   get_pair_weight(*new_j, integer_scores, already_played))
+                    if sum(new_weights) < weights[i] + weights[j]:
+                        pairs[i], pairs[j] = new_i, new_j
+                        weights[i], weights[j] = new_weights
+                        improved = True
+                        break
+                if not weights[i]:
+                    break
+    return pairs
+
+
+def get_total_weight(matching: set[tuple[PlayerInfo|str]], integer_scores: dict[PlayerInfo, int],
+                     already_played: OpponentHistory) -> int:
+    """
+    The sum of the matching weights (see `build_weight_matrix`) of a pairing,
+    without building the whole matrix.
+    """
+    return sum(get_pair_weight(p1, p2, integer_scores, already_played) for p1, p2 in matching)
+
+
+def get_pair_weight(p1: PlayerInfo | str, p2: PlayerInfo | str, integer_scores: dict[PlayerInfo, int],
+                    already_played: OpponentHistory) -> int:
+    """
+    The matching weight of one pair, same as in `build_weight_matrix`.
+    """
+    if "BYE" in (p1, p2):
+        player_info = p2 if p1 == "BYE" else p1
+        had_bye = (None, player_info.player.name) in already_played
+        return ((30 if had_bye else 10) + integer_scores[player_info])**3
+    difference = abs(integer_scores[p1] - integer_scores[p2])
+    difference += 20 * ((p1.player.name, p2.player.name) in already_played)
+    weight = 2 * difference**3
+    if weight:
+        weight += p1.mispairings + p2.mispairings
+    return weight
+
+
+def find_block_matching(player_info_list_in_round: list[PlayerInfo], integer_scores: dict[PlayerInfo, int],
+                        already_played: OpponentHistory, block_size: int = 0, window: int | None = None,
+                        backend: str = "networkx", metrics: PairingMetrics | None = None,
+                        boundary_pairs: int = 8) -> set[tuple[PlayerInfo|str]]:
+    """
+    Splits the players into blocks of consecutive score groups of at least `block_size`
+    players and matches every block on its own, in parallel, instead of one big matching.
+
+    If a block would have an odd number of players, one player of its lowest
+    level floats down into the next block, like in the score group pairing.
+    The BYE (if any) stays in the bottom block. With cubed score differences the
+    optimal matching rarely crosses a boundary otherwise, but it can to avoid
+    rematches or repeat mispairings. So afterwards the pairs of the two
+    levels at every boundary that have a penalty, plus `boundary_pairs` penalty free
+    pairs of each level to move players around with, are matched again together
+    and kept if that's cheaper.
+    """
+    if metrics is None:
+        metrics = PairingMetrics()
+
+    groups: dict[int, list[PlayerInfo]] = defaultdict(list)
+    for player_info in player_info_list_in_round:
+        groups[integer_scores[player_info]].append(player_info)
+    blocks: list[list[PlayerInfo]] = [[]]
+    block_levels: list[list[int]] = [[]]
+    for level in sorted(groups, reverse=True):
+        if block_size and len(blocks[-1]) >= block_size:
+            floaters = []
+            if len(blocks[-1]) % 2:
+                # float one player down, preferably one who hasn't been mispaired yet
+                last_level = [p for p in blocks[-1] if integer_scores[p] == block_levels[-1][-1]]
+                floater = next((p for p in reversed(last_level) if not p.mispairings), last_level[-1])
+                blocks[-1].remove(floater)
+                floaters.append(floater)
+            blocks.append(floaters)
+            block_levels.append([])
+        blocks[-1] += groups[level]
+        block_levels[-1].append(level)
+    metrics.count("blocks", len(blocks))
+    if len(blocks) == 1:
+        return find_optimal_matching(player_info_list_in_round, integer_scores, already_played, window, backend, metrics)
+
+    print(f"Matching {len(blocks)} score blocks of {[len(block) for block in blocks]} players")
+    block_scores = [{p: integer_scores[p] for p in block} for block in blocks]
+    with metrics.span("block_matching"):
+        arguments = (blocks, block_scores, repeat(already_played), repeat(window), repeat(backend))
+        if not processes_allowed():
+            # e.g. already in a worker of pair_before_deadline, which can't start processes of its own
+            results = list(map(find_optimal_matching, *arguments))
+        else:
+            with ProcessPoolExecutor(max_workers=min(len(blocks), os.cpu_count() or 1)) as executor:
+                results = list(executor.map(find_optimal_matching, *arguments))
+
+    # the other processes send back copies, use our own players
+    player_infos = {player_info.player.name: player_info for player_info in player_info_list_in_round}
+    matching = [tuple(p if p == "BYE" else player_infos[p.player.name] for p in pair) for result in results for pair in result]
+
+    with metrics.span("boundary_repair"):
+        for upper, lower in zip(block_levels, block_levels[1:]):
+            zone = []
+            for level in (upper[-1], lower[0]):
+                penalised, penalty_free = [], []
+                for pair in matching:
+                    if any(p != "BYE" and integer_scores[p] == level for p in pair):
+                        weight = get_pair_weight(*pair, integer_scores, already_played)
+                        (penalised if weight else penalty_free).append(pair)
+                zone += penalised + penalty_free[:boundary_pairs]
+            zone = list(dict.fromkeys(zone))
+            zone_players = [p for pair in zone for p in pair if p != "BYE"]
+            repaired = find_optimal_matching(zone_players, {p: integer_scores[p] for p in zone_players},
+                                             already_played, window, backend)
+            if get_total_weight(repaired, integer_scores, already_played) < get_total_weight(zone, integer_scores, already_played):
+                metrics.count("boundary_repairs", 1, add=True)
+                zone = set(zone)
+                matching = [pair for pair in matching if pair not in zone] + list(repaired)
+    return set(matching)
+
+
+def find_optimal_matching(player_info_list_in_round: list[PlayerInfo], integer_scores: dict[PlayerInfo, int],
+                          already_played: OpponentHistory, window: int | None = None,
+                          backend: str = "networkx", metrics: PairingMetrics | None = None) -> set[tuple[PlayerInfo|str]]:
+    """
+    Finds a minimum weight maximum cardinality matching over all players,
+    with a "BYE" node if the number of players is odd.
+    Slow (O(n^3)), but always finds the best pairing there is.
+    Which algorithm is used is picked by `backend`, see `matching.MATCHING_BACKENDS`.
+
+    With a `window`, only players at most that many score levels apart are
+    connected (see `build_candidate_edges`). If that sparse graph has no perfect
+    matching the window is doubled, until it covers everyone and the full
+    graph is used. The pairing is then only the best one within the window,
+    which almost always is the best one there is, but that isn't proven.
+
+    Backends that support it start from the pairs within the score groups
+    (see `build_initial_matching`), so they only have to solve for the rest.
+    """
+    from matching import MATCHING_BACKENDS
+
+    if metrics is None:
+        metrics = PairingMetrics()
+    with metrics.span("weight_construction"):
+        scores, played, mispairings, had_bye = build_pairing_arrays(player_info_list_in_round, integer_scores, already_played)
+        weights = build_weight_matrix(scores, played, mispairings, had_bye)
+    with metrics.span("warm_start"):
+        initial = build_initial_matching(scores, played)
+    metrics.count("warm_start_pairs", len(initial))
+    # the BYE is the extra last node, if there is one
+    nodes = player_info_list_in_round + ["BYE"] * (len(weights) - len(player_info_list_in_round))
+
+    n_levels = int(scores.max() - scores.min()) if len(scores) else 0
+    while True:
+        if window is not None and window >= n_levels:
+            window = None
+
+        # find a minimum weight maximum cardinality matching
+        with metrics.span("graph_build"):
+            candidates = build_candidate_edges(weights, scores, played, had_bye, window)
+            n_edges = int(candidates.sum())
+        metrics.count("edges", n_edges, add=True)
+        print(f"Finding optimal matching with {backend} (window: {window if window is not None else 'all'}, edges: {n_edges})")
+        with metrics.span("matching"):
+            matching = MATCHING_BACKENDS[backend](weights, candidates, initial)
+        if window is None or 2 * len(matching) == len(weights):
+            return {(nodes[i], nodes[j]) for i, j in matching}
+        print("No perfect matching within the window, widening it")
+        metrics.count("window_widenings", 1, add=True)
+        window = max(1, window * 2)
+
+
+def build_initial_matching(scores: np.ndarray, played: np.ndarray) -> set[tuple[int, int]]:
+    """
+    Greedily pairs players within their score group who haven't played each other yet,
+    as a starting point for the matching. These pairs have weight 0,
+    and most of them are usually still there in the optimal matching, as it
+    only has to move players around where groups are odd or everyone's played.
+    """
+    import numpy as np
+
+    matching = set()
+    order = np.argsort(scores, kind="stable")
+    groups = np.split(order, np.flatnonzero(np.diff(scores[order])) + 1)
+    for group in groups:
+        unpaired = group.tolist()
+        while len(unpaired) > 1:
+            player = unpaired.pop(0)
+            opponent = next((other for other in unpaired if not played[player, other]), None)
+            if opponent is not None:
+                unpaired.remove(opponent)
+                matching.add((player, opponent))
+    return matching
+
+
+def build_pairing_arrays(player_info_list_in_round: list[PlayerInfo], integer_scores: dict[PlayerInfo, int],
+                         already_played: OpponentHistory) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Turns the players into arrays indexed by their position in `player_info_list_in_round`:
+    integer scores, an already played mask, mispairing counts and whether they had a BYE.
+    """
+    import numpy as np
+
+    n = len(player_info_list_in_round)
+    index = {player_info.player.name: i for i, player_info in enumerate(player_info_list_in_round)}
+    scores = np.fromiter((integer_scores[p] for p in player_info_list_in_round), dtype=np.int64, count=n)
+    mispairings = np.fromiter((p.mispairings for p in player_info_list_in_round), dtype=np.int64, count=n)
+    had_bye = np.fromiter(((None, p.player.name) in already_played for p in player_info_list_in_round), dtype=bool, count=n)
+
+    played = np.zeros((n, n), dtype=bool)
+    pairs = [(i, index[opponent]) for i, player_info in enumerate(player_info_list_in_round)
+             for opponent in already_played.opponents.get(player_info.player.name, ()) if opponent in index]
+    if pairs:
+        rows, cols = zip(*pairs)
+        played[rows, cols] = True
+    return scores, played, mispairings, had_bye
+
+
+def build_weight_matrix(scores: np.ndarray, played: np.ndarray, mispairings: np.ndarray, had_bye: np.ndarray) -> np.ndarray:
+    """
+    Builds the full matrix of matching weights in one go, with an extra
+    last row and column for the BYE if there's an odd number of players.
+
+    Players are weighted by their double cubed score difference, plus 20 if
+    they already played, plus a small penalty term if it's a repeat mispairing.
+    The BYE is weighted by the cubed score (plus 10, or 30 if they had one before),
+    so it ends up at the bottom of the standings.
+
+    The matrix is int32 unless the weights can get too big for it, and is filled in place
+    as big fields make several of them take a lot of memory.
+    """
+    import numpy as np
+
+    n = len(scores)
+    size = n + n % 2
+    highest = 0
+    if n:
+        highest = max(2 * (int(scores.max() - scores.min()) + 20)**3 + 2 * int(mispairings.max()),
+                       (30 + int(scores.max()))**3)
+    weights = np.zeros((size, size), dtype=np.int32 if highest <= np.iinfo(np.int32).max else np.int64)
+
+    player_weights = weights[:n, :n]
+    np.subtract(scores[:, None], scores[None, :], out=player_weights)
+    np.abs(player_weights, out=player_weights)
+    np.add(player_weights, 20, out=player_weights, where=played)
+    np.power(player_weights, 3, out=player_weights)
+    player_weights *= 2
+    mispaired = player_weights > 0
+    np.add(player_weights, mispairings[:, None], out=player_weights, where=mispaired)
+    np.add(player_weights, mispairings[None, :], out=player_weights, where=mispaired)
+
+    if n % 2:
+        bye_weights = (np.where(had_bye, 30, 10) + scores)**3
+        weights[:n, n] = bye_weights
+        weights[n, :n] = bye_weights
+    return weights
+
+
+def build_candidate_edges(weights: np.ndarray, scores: np.ndarray, played: np.ndarray, had_bye: np.ndarray,
+                          window: int | None = None) -> np.ndarray:
+    """
+    Gathers the edges for the matching as an upper triangular mask over the weights.
+    Without a window this is every pair of players. With one, only players at most
+    `window` score levels apart are connected and rematches are left out,
+    as those are never worth it with cubed score differences.
+    The BYE is likewise only connected to the players in the bottom `window` levels
+    who didn't have one yet, so a repeat BYE widens the window instead.
+    """
+    import numpy as np
+
+    n = len(scores)
+    # everything above the diagonal, without a temporary matrix
+    candidates = np.tri(len(weights), dtype=bool)
+    np.logical_not(candidates, out=candidates)
+    if window is not None:
+        # a block of rows per score level, instead of all score differences at once
+        for level in np.unique(scores):
+            rows = np.flatnonzero(scores == level)
+            candidates[rows, :n] &= np.abs(scores - level) <= window
+        candidates[:n, :n][played] = False
+        if len(weights) > n:
+            candidates[:n, n] &= (scores - scores.min() <= window) & ~had_bye
+    return candidates
+
+
+def pair_by_score_groups(player_info_list_in_round: list[PlayerInfo], integer_scores: dict[PlayerInfo, int],
+                         already_played: OpponentHistory) -> set[tuple[PlayerInfo|str]] | None:
+    """
+    Dutch/Monrad style pairing, going through the score groups from the top down.
+    Each group is split in a top and bottom half which are paired with each other,
+    skipping over rematches. An odd group floats one player down into the next group.
+    The BYE goes to a player in the bottom group who didn't have one yet.
+
+    This is (close to) linear in the number of players, and when the result passes
+    `is_valid_score_group_pairing` it has the same weight as the optimal matching:
+    one single-level mispairing per odd group is the least any pairing can do.
+    Returns None if it gets stuck, in which case the optimal matching has to be used.
+    """
+    groups: dict[int, list[PlayerInfo]] = defaultdict(list)
+    for player_info in player_info_list_in_round:
+        groups[integer_scores[player_info]].append(player_info)
+    levels = sorted(groups, reverse=True)
+
+    matching = set()
+    if len(player_info_list_in_round) % 2:
+        bottom_group = groups[levels[-1]]
+        bye_player = next((p for p in bottom_group if (None, p.player.name) not in already_played), None)
+        if bye_player is None:
+            return None
+        bottom_group.remove(bye_player)
+        matching.add((bye_player, "BYE"))
+
+    floater = None
+    for level in levels:
+        group = groups[level]
+        if floater is not None:
+            # only float to someone who hasn't been mispaired yet
+            partner = next((p for p in group if not p.mispairings
+                            and (floater.player.name, p.player.name) not in already_played), None)
+            if partner is None:
+                return None
+            group.remove(partner)
+            matching.add((floater, partner))
+            floater = None
+
+        if len(group) % 2:
+            # float from the bottom of the group, again only someone not mispaired before
+            floater = next((p for p in reversed(group) if not p.mispairings), None)
+            if floater is None:
+                return None
+            group.remove(floater)
+
+        half = len(group) // 2
+        unpaired = group[half:]
+        for player_info in group[:half]:
+            opponent = next((p for p in unpaired if (player_info.player.name, p.player.name) not in already_played), None)
+            if opponent is None:
+                return None
+            unpaired.remove(opponent)
+            matching.add((player_info, opponent))
+
+    if not is_valid_score_group_pairing(matching, player_info_list_in_round, integer_scores, already_played):
+        return None
+    return matching
+
+
+def is_valid_score_group_pairing(matching: set[tuple[PlayerInfo|str]], player_info_list_in_round: list[PlayerInfo],
+                                 integer_scores: dict[PlayerInfo, int], already_played: OpponentHistory) -> bool:
+    """
+    Checks a pairing against the same things the matching weights penalise:
+    everyone paired exactly once, no rematches, the BYE to a bottom player without
+    a previous BYE, and mispairings only one level apart between players that
+    have never been mispaired before.
+    """
+    seen = set()
+    lowest = min(integer_scores.values(), default=0)
+    for p1, p2 in matching:
+        if p2 == "BYE":
+            if integer_scores[p1] != lowest or (None, p1.player.name) in already_played:
+                return False
+            seen.add(p1.player.name)
+            continue
+        if (p1.player.name, p2.player.name) in already_played:
+            return False
+        difference = abs(integer_scores[p1] - integer_scores[p2])
+        if difference > 1 or (difference and (p1.mispairings or p2.mispairings)):
+            return False
+        seen.add(p1.player.name)
+        seen.add(p2.player.name)
+    return len(seen) == len(player_info_list_in_round) == sum(2 - ("BYE" in m) for m in matching)
+
+
+def apply_byes(matchups: list[Matchup]) -> Round:
+    """
+    Turns freshly generated matchups into a round, with the BYEs already won.
+    """
+    for matchup in matchups:
+        if not matchup.player2:
+            matchup.winner = matchup.player1
+            matchup.score_player1 = 1.0
+            matchup.notes = "BYE"
+    return Round(matchups)
+
+
+def get_scores_for_round_generation(player_info_list: list[PlayerInfo], rounds: list[Round], settings: PairingSettings,
+                                    rng: random.Random | None = None) -> dict[PlayerInfo, float]:
+    """
+    Calculates the score or each player to be used in round generation.
+    Specifically, effective score is the sum of scores over all games for each player
+    plus each delayed game gives one point to one player at random, using `rng`
+    (the global `random` if not given).
+
+    This has the effect of intentionally delayed games not being beneficial
+    usually, though this cannot be prevented entirely.
+    """
+
+    delay_points = defaultdict(int)
+    for round in rounds:
+        for match in round.matchups:
+            if match.winner == "Delayed":
+                # If we allow random point assignment and flip a coin invert the points
+                if settings.random_ext_point_assignment and (rng or random).random() > 0.5:
+                    delay_points[match.player1] += settings.p2_ext_point
+                    delay_points[match.player2] += settings.p1_ext_point
+                else:
+                    delay_points[match.player1] += settings.p1_ext_point
+                    delay_points[match.player2] += settings.p2_ext_point
+
+    effective_scores = {}
+    for player_info in player_info_list:
+        effective_scores[player_info] = player_info.score + delay_points[player_info.player.name]
+    return effective_scores
+
+
+def assign_integer_scores(player_info_effective_scores: dict[PlayerInfo, float]) -> dict[PlayerInfo, int]:
+    """
+    Assigns ordinal integer scores to the players,
+    as float scores are supported by the scoring system
+    but not (properly) by the graph algorithms.
+    """
+    import numpy as np
+
+    player_infos = list(player_info_effective_scores)
+    scores = np.fromiter(player_info_effective_scores.values(), dtype=np.float64, count=len(player_infos))
+    order = np.argsort(scores, kind="stable")
+    sorted_scores = scores[order]
+
+    # every score not close to the previous one (starting from 0) is a step up
+    steps = ~np.isclose(sorted_scores, np.concatenate(([0.], sorted_scores[:-1])), rtol=1e-9, atol=0.)
+    integers = np.empty(len(player_infos), dtype=np.int64)
+    integers[order] = np.cumsum(steps)
+    return dict(zip(player_infos, integers.tolist()))
+
+
+def create_bracket(participants: list[PlayerInfo]) -> list[Matchup]:
+    participants_count = len(participants)
+    rounds = math.ceil(math.log(participants_count, 2))
+    bracket_size = 2 ** rounds
+    required_byes = bracket_size - participants_count
+
+    print(f"Number of participants: {participants_count}")
+    print(f"Number of rounds: {rounds}")
+    print(f"Bracket size: {bracket_size}")
+    print(f"Required number of byes: {required_byes}")
+
+    if participants_count < 2:
+        return []
+
+    match_seeds = [[1, 2]]
+
+    for round_num in range(1, rounds):
+        round_match_seeds = []
+        sum_seeds = 2 ** (round_num + 1) + 1
+
+        for match in match_seeds:
+            home = change_into_bye(match[0], participants_count)
+            away = change_into_bye(sum_seeds - match[0], participants_count)
+            round_match_seeds.append([home, away])
+
+            home = change_into_bye(sum_seeds - match[1], participants_count)
+            away = change_into_bye(match[1], participants_count)
+            round_match_seeds.append([home, away])
+
+        match_seeds = round_match_seeds
+
+    matches = []
+    for match in match_seeds:
+        p1 = participants[match[0]-1].player.name if match[0] is not None else "BYE"
+        p2 = participants[match[1]-1].player.name if match[1] is not None else "BYE"
+        new_match = Matchup(p1, p2)
+        matches.append(new_match)
+
+    print(matches)
+
+    return matches
+
+
+def change_into_bye(seed, participants_count):
+    return seed if seed <= participants_count else None
+
+
+def calculate_players_stats(players: list[Player], rounds: list[Round], as_dict: bool = False,
+                            history: OpponentHistory | None = None) -> list[PlayerInfo]:
+    """
+    Calculates everyone's score, resistance, wins, delays and mispairings.
+    With the `history` of these rounds, resistance is looked up from the opponents
+    index instead of going through all matchups a second time.
+    """
+    player_info_dict: dict[str, PlayerInfo] = {}
+    for player in players:
+        player_info_dict[player.name] = PlayerInfo(player)
+
+    # Scores
+    for round in rounds:
+        for matchup in round.matchups:
+            # if not a bye matchup
+            if matchup.player2:
+                was_mispairing = player_info_dict[matchup.player2].score != player_info_dict[matchup.player1].score
+                if was_mispairing:
+                    player_info_dict[matchup.player1].mispairings += 1
+                    player_info_dict[matchup.player2].mispairings += 1
+
+                player_info_dict[matchup.player2].score += matchup.score_player2
+                player_info_dict[matchup.player2].n_played += 1
+                player_info_dict[matchup.player2].n_wins += matchup.winner == matchup.player2
+                player_info_dict[matchup.player2].active_delays += matchup.winner == "Delayed"
+
+            player_info_dict[matchup.player1].score += matchup.score_player1
+            player_info_dict[matchup.player1].n_played += 1
+            player_info_dict[matchup.player1].n_wins += matchup.winner == matchup.player1
+            player_info_dict[matchup.player1].active_delays += matchup.winner == "Delayed"
+
+    # resistance
+    if history is not None:
+        for name, player_info in player_info_dict.items():
+            # add opponents' scores to resistance
+            for opponent, times_played in history.opponents.get(name, {}).items():
+                player_info.resistance += times_played * player_info_dict[opponent].score
+    else:
+        for round in rounds:
+            for matchup in round.matchups:
+                if not matchup.player2: # BYE
+                    continue
+                p1 = matchup.player1
+                p2 = matchup.player2
+                # add opponent's score to resistance
+                player_info_dict[p1].resistance += player_info_dict[p2].score
+                player_info_dict[p2].resistance += player_info_dict[p1].score
+
+
+    if as_dict:
+        return player_info_dict
+    return list(player_info_dict.values())
+
+
+
+
+# TODO: Future work. Create full interactive bracket page
+# def build_full_bracket_from_first_round(first_round: list[Matchup]) -> list[list[Matchup]]:
+#     bracket = [first_round]
+#     total_players = len(first_round) * 2
+#     total_rounds = int(math.log2(total_players))
+
+#     # Build future rounds with empty matches
+#     for r in range(1, total_rounds):
+#         matches_in_round = len(bracket[r - 1]) // 2
+#         next_round = [Matchup(Player(""), Player("")) for _ in range(matches_in_round)]
+#         bracket.append(next_round)
+
+#     return bracket
@@ -0,0 +1,367 @@
+"""
+Headless pairing service for running many tournaments at once on one machine.
+
+    python service.py                                  # http://127.0.0.1:8765
+    python service.py --port 9000 --workers 8
+    python service.py --unix-socket /tmp/swiss.sock
+    python service.py event1.json event2.json          # starts with these sessions loaded
+
+Tournaments are kept in memory and use the same JSON as the session files:
+
+    GET    /tournaments                      ids of all tournaments
+    PUT    /tournaments/<id>                 create or replace one from a session
+    GET    /tournaments/<id>                 the session, to save it
+    DELETE /tournaments/<id>
+    POST   /tournaments/<id>/results         {"round": 1, "results": [{"player": "Alice", "winner": "Alice"}, ...]}
+    POST   /tournaments/<id>/rounds          pairs the next round and returns it
+    GET    /metrics                          queue depth and latencies
+
+Requests are handled on one asyncio loop, the pairing itself runs in a bounded process pool
+with one process per pairing (seeds, score blocks and deadlines don't start more of their own).
+Every tournament has its own lock, so results for one event wait for its pairing,
+but other events carry on.
+"""
+import argparse
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+import json
+import os
+import re
+import signal
+import time
+import traceback
+from classes import *
+from instrumentation import PairingMetrics
+from pairing import PairingSettings, apply_byes, generate_matchups, use_single_process
+from session import SessionError, read_session_file, session_from_dict, session_to_dict
+
+
+class ServiceError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Tournament():
+    """
+    One event as the service keeps it, like the state of a `MainWindow`.
+    """
+    def __init__(self, players: list[Player], rounds: list[Round], settings: dict):
+        self.players = players
+        self.rounds = rounds
+        self.saved_settings = settings
+        self.settings = PairingSettings(settings)
+        self.history = OpponentHistory(rounds)
+        self.pairing_metrics: list[dict] = []
+        self.lock = asyncio.Lock()
+
+    def to_dict(self) -> dict:
+        return session_to_dict(self.players, self.rounds, {**self.saved_settings, **self.settings.to_dict()},
+                               self.pairing_metrics)
+
+
+class LatencyStats():
+    """
+    The last `size` durations of something, for the metrics.
+    """
+    def __init__(self, size: int = 1000):
+        self.count = 0
+        self.errors = 0
+        self.durations = deque(maxlen=size)
+
+    def add(self, seconds: float, error: bool = False):
+        self.count += 1
+        self.errors += error
+        self.durations.append(seconds)
+
+    def to_dict(self) -> dict:
+        durations = sorted(self.durations)
+        if not durations:
+            return {"count": self.count, "errors": self.errors}
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": 1000 * sum(durations) / len(durations),
+            "p50_ms": 1000 * durations[len(durations) // 2],
+            "p95_ms": 1000 * durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            "max_ms": 1000 * durations[-1],
+        }
+
+
+def pair_tournament(players: list[Player], rounds: list[Round], settings: PairingSettings,
+                    history: OpponentHistory) -> tuple[list[Matchup], dict]:
+    """
+    Runs in the process pool, so everything in and out gets pickled.
+    """
+    metrics = PairingMetrics()
+    matchups = generate_matchups(players, rounds, settings, history, metrics=metrics)
+    return matchups, metrics.to_dict()
+
+
+class PairingService():
+    """
+    Holds the tournaments and answers the requests. `max_queue` is how many
+    pairings may be waiting for or running in the pool before new ones are refused.
+    """
+    ROUTES = [
+        ("GET", re.compile(r"/metrics"), "get_metrics"),
+        ("GET", re.compile(r"/tournaments"), "list_tournaments"),
+        ("GET", re.compile(r"/tournaments/([^/]+)"), "get_tournament"),
+        ("PUT", re.compile(r"/tournaments/([^/]+)"), "put_tournament"),
+        ("DELETE", re.compile(r"/tournaments/([^/]+)"), "delete_tournament"),
+        ("POST", re.compile(r"/tournaments/([^/]+)/results"), "post_results"),
+        ("POST", re.compile(r"/tournaments/([^/]+)/rounds"), "post_round"),
+    ]
+
+    def __init__(self, workers: int | None = None, max_queue: int = 64):
+        self.workers = workers or os.cpu_count() or 1
+        # the pairings don't start processes of their own, so `workers` bounds the CPU use
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=use_single_process)
+        self.max_queue = max_queue
+        self.tournaments: dict[str, Tournament] = {}
+        self.pending = 0
+        self.started = time.time()
+        self.latencies: dict[str, LatencyStats] = {}
+        self.pairing_wait = LatencyStats()
+        self.pairing_time = LatencyStats()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Just enough HTTP/1.1 for JSON requests, with keep-alive.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self.dispatch(method, target.split("?")[0].rstrip("/"), body)
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> tuple[HTTPStatus, object]:
+        start = time.perf_counter()
+        route = "unknown"
+        status = HTTPStatus.OK
+        try:
+            for route_method, pattern, handler in self.ROUTES:
+                match = pattern.fullmatch(path)
+                if match:
+                    if route_method != method:
+                        continue
+                    route = handler
+                    data = json.loads(body) if body else None
+                    return status, await getattr(self, handler)(*match.groups(), data)
+            status = HTTPStatus.NOT_FOUND
+            return status, {"error": f"No route for {method} {path}"}
+        except ServiceError as e:
+            status = e.status
+            return status, {"error": e.message}
+        except json.JSONDecodeError as e:
+            status = HTTPStatus.BAD_REQUEST
+            return status, {"error": f"Invalid JSON: {e}"}
+        except Exception as e:
+            traceback.print_exc()
+            status = HTTPStatus.INTERNAL_SERVER_ERROR
+            return status, {"error": str(e)}
+        finally:
+            self.latencies.setdefault(route, LatencyStats()).add(time.perf_counter() - start, status.value >= 400)
+
+    def get(self, tournament_id: str) -> Tournament:
+        if tournament_id not in self.tournaments:
+            raise ServiceError(HTTPStatus.NOT_FOUND, f"No tournament {tournament_id}")
+        return self.tournaments[tournament_id]
+
+    async def get_metrics(self, data) -> dict:
+        return {
+            "uptime_seconds": time.time() - self.started,
+            "tournaments": len(self.tournaments),
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queue_depth": max(0, self.pending - self.workers),
+            "running": min(self.pending, self.workers),
+            "pairing_wait": self.pairing_wait.to_dict(),
+            "pairing_time": self.pairing_time.to_dict(),
+            "requests": {route: stats.to_dict() for route, stats in self.latencies.items()},
+        }
+
+    async def list_tournaments(self, data) -> list[str]:
+        return list(self.tournaments)
+
+    async def get_tournament(self, tournament_id: str, data) -> dict:
+        tournament = self.get(tournament_id)
+        async with tournament.lock:
+            return tournament.to_dict()
+
+    async def put_tournament(self, tournament_id: str, data) -> dict:
+        if not isinstance(data, dict) or "players" not in data:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "Expected a session with players")
+        try:
+            players, rounds, settings = session_from_dict(data)
+            tournament = Tournament(players, rounds, settings or {})
+        except (SessionError, ValueError) as e:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, str(e))
+        tournament.pairing_metrics = data.get("pairing_metrics", [])
+
+        old = self.tournaments.get(tournament_id)
+        if old:
+            # don't replace it halfway through a pairing
+            async with old.lock:
+                self.tournaments[tournament_id] = tournament
+        else:
+            self.tournaments[tournament_id] = tournament
+        print(f"Tournament {tournament_id}: {len(players)} players, {len(rounds)} rounds")
+        return {"players": len(players), "rounds": len(rounds)}
+
+    async def delete_tournament(self, tournament_id: str, data) -> dict:
+        tournament = self.get(tournament_id)
+        async with tournament.lock:
+            del self.tournaments[tournament_id]
+        return {}
+
+    async def post_results(self, tournament_id: str, data) -> dict:
+        """
+        Sets winners (and optionally scores) by the name of either player in the matchup,
+        the same way as picking a winner in the app.
+        """
+        tournament = self.get(tournament_id)
+        if not isinstance(data, dict) or not isinstance(data.get("results"), list):
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "Expected {\"round\": ..., \"results\": [...]}")
+        async with tournament.lock:
+            round_number = data.get("round", len(tournament.rounds))
+            if not isinstance(round_number, int) or not 1 <= round_number <= len(tournament.rounds):
+                raise ServiceError(HTTPStatus.BAD_REQUEST, f"No round {round_number}")
+            round_index = round_number - 1
+            matchups = {}
+            for matchup in tournament.rounds[round_index].matchups:
+                matchups[matchup.player1] = matchup
+                if matchup.player2:
+                    matchups[matchup.player2] = matchup
+
+            # check everything first, so a bad entry doesn't leave half the results applied
+            updates = []
+            for result in data["results"]:
+                if not isinstance(result, dict) or not isinstance(result.get("player"), str):
+                    raise ServiceError(HTTPStatus.BAD_REQUEST, f"Expected {{\"player\": ..., \"winner\": ...}}, not {result!r}")
+                if any(not isinstance(result.get(key, 0.), (int, float)) for key in ("score_player1", "score_player2")):
+                    raise ServiceError(HTTPStatus.BAD_REQUEST, f"Scores should be numbers in {result!r}")
+                matchup = matchups.get(result["player"])
+                if matchup is None:
+                    raise ServiceError(HTTPStatus.BAD_REQUEST, f"{result.get('player')} isn't in round {round_number}")
+                winner = result.get("winner")
+                if winner not in (matchup.player1, matchup.player2, "No Winner", "Delayed") or winner is None:
+                    raise ServiceError(HTTPStatus.BAD_REQUEST, f"Invalid winner {winner} for {matchup}")
+                updates.append((matchup, winner, result))
+
+            for matchup, winner, result in updates:
+                tournament.history.update_result(round_index, matchup.winner, winner)
+                matchup.winner = winner
+                matchup.score_player1 = float(result.get("score_player1", winner == matchup.player1))
+                matchup.score_player2 = float(result.get("score_player2", bool(matchup.player2) and winner == matchup.player2))
+            return {"updated": len(updates)}
+
+    async def post_round(self, tournament_id: str, data) -> dict:
+        tournament = self.get(tournament_id)
+        async with tournament.lock:
+            if not tournament.players:
+                raise ServiceError(HTTPStatus.CONFLICT, "No players")
+            if tournament.rounds:
+                unfinished = [m for m in tournament.rounds[-1].matchups if not m.winner]
+                if unfinished:
+                    raise ServiceError(HTTPStatus.CONFLICT, f"Round {len(tournament.rounds)} has {len(unfinished)} "
+                                                            f"matchups without a winner, for example {unfinished[0]}")
+            if self.pending >= self.max_queue:
+                raise ServiceError(HTTPStatus.SERVICE_UNAVAILABLE, "Too many pairings queued, try again later")
+
+            self.pending += 1
+            submitted = time.perf_counter()
+            try:
+                future = self.pool.submit(pair_tournament, tournament.players, tournament.rounds,
+                                          tournament.settings, tournament.history)
+                matchups, metrics = await asyncio.wrap_future(future)
+            finally:
+                self.pending -= 1
+            total = time.perf_counter() - submitted
+            solve_time = metrics["spans"].get("total", 0.)
+            self.pairing_time.add(solve_time)
+            self.pairing_wait.add(max(0., total - solve_time))
+
+            new_round = apply_byes(matchups)
+            tournament.rounds.append(new_round)
+            tournament.history.add_round(new_round)
+            tournament.pairing_metrics.append({"round": len(tournament.rounds), **metrics})
+            return {
+                "round": len(tournament.rounds),
+                "matchups": new_round.to_dict()["matchups"],
+                "cost": metrics["counters"].get("cost"),
+                "optimal": metrics["counters"].get("optimal"),
+                "deadline_reached": metrics["counters"].get("deadline_reached"),
+            }
+
+
+async def serve(service: PairingService, host: str, port: int, unix_socket: str | None = None):
+    if unix_socket:
+        server = await asyncio.start_unix_server(service.handle_connection, path=unix_socket)
+        print(f"Pairing service listening on {unix_socket}")
+    else:
+        server = await asyncio.start_server(service.handle_connection, host, port)
+        print(f"Pairing service listening on http://{host}:{port}")
+
+    # being stopped (e.g. by a service manager) should also shut down the pool, like Ctrl+C
+    stopped = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    except (NotImplementedError, RuntimeError):
+        # not on Windows, or when not running in the main thread
+        pass
+    async with server:
+        await stopped.wait()
+    print("Pairing service stopped")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Local pairing service for many tournaments at once.")
+    parser.add_argument("sessions", nargs="*", help="session files to load at startup, named after the file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, help="pairing processes (default: one per core)")
+    parser.add_argument("--max-queue", type=int, default=64, help="pairings that may be queued before refusing new ones")
+    args = parser.parse_args(argv)
+
+    service = PairingService(args.workers, args.max_queue)
+    for file_name in args.sessions:
+        players, rounds, settings = session_from_dict(read_session_file(file_name))
+        tournament_id = os.path.splitext(os.path.basename(file_name))[0]
+        service.tournaments[tournament_id] = Tournament(players, rounds, settings or {})
+        print(f"Loaded {tournament_id}: {len(players)} players, {len(rounds)} rounds")
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,454 @@
+"""
+Reading and writing tournament sessions, shared by the GUI and the command line.
+
+Sessions are saved as JSON, or in a compact binary format when the file name ends in
+`.swiss`. Reading detects the format from the file itself. Both go through the same
+dict (`session_to_dict`), so everything else doesn't need to know the difference.
+"""
+from array import array
+from contextlib import nullcontext
+import gc
+import json
+import operator
+import os
+import struct
+import sys
+import tempfile
+from classes import *
+from pairing import MATCHING_BACKEND_NAMES
+
+# version of the session dict, saved as "version". Files from before it was
+# added are version 1, `SESSION_MIGRATIONS` brings older files up to date.
+SESSION_VERSION = 2
+
+
+def is_whole_number(value) -> bool:
+    # bools are ints too
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+# what the settings that pairing depends on may be, anything else fails only once a round is paired
+SETTING_CHECKS = {
+    "p1_ext_point": (is_number, "a number"),
+    "p2_ext_point": (is_number, "a number"),
+    "random_ext_point_assignment": (lambda value: isinstance(value, bool), "true or false"),
+    "pairing_window": (lambda value: is_whole_number(value) and value >= 1, "a whole number of at least 1"),
+    "matching_backend": (lambda value: value in MATCHING_BACKEND_NAMES, f"one of {', '.join(MATCHING_BACKEND_NAMES)}"),
+    "pairing_seeds": (lambda value: is_whole_number(value) and value >= 1, "a whole number of at least 1"),
+    "pairing_deadline": (lambda value: is_number(value) and value >= 0, "a number of seconds, 0 for no limit"),
+    "pairing_block_size": (lambda value: is_whole_number(value) and value >= 0, "a whole number, 0 for one block"),
+    "round_tables_kept": (lambda value: is_whole_number(value) and value >= 0, "a whole number, 0 for all"),
+}
+
+
+class SessionError(ValueError):
+    """
+    A session that can't be loaded, with everything that's wrong with it in `problems`.
+    """
+    def __init__(self, problems: list[str]):
+        self.problems = problems
+        shown = "\n".join(problems[:20])
+        if len(problems) > 20:
+            shown += f"\n... and {len(problems) - 20} more"
+        super().__init__(f"The session can't be loaded:\n{shown}")
+
+
+def session_to_dict(players: list[Player], rounds: list[Round], settings: dict,
+                    pairing_metrics: list[dict] | None = None) -> dict:
+    data = {
+        "version": SESSION_VERSION,
+        "players": {player.name: player.dropped for player in players},
+        "rounds": [r.to_dict() for r in rounds],
+        "settings": settings,
+    }
+    # timings of every round generation, to look into slow rounds afterwards
+    if pairing_metrics:
+        data["pairing_metrics"] = pairing_metrics
+    return data
+
+
+# a saved round is either {"matchups": [matchup dicts]} or, read from a binary
+# file, {"columns": {key: list of values}} with these keys
+MATCHUP_COLUMNS = ("player1", "player2", "winner", "score_player1", "score_player2", "notes")
+
+
+def round_matchup_dicts(saved_round: dict) -> list[dict]:
+    if "columns" in saved_round:
+        columns = saved_round["columns"]
+        return [dict(zip(MATCHUP_COLUMNS, values)) for values in zip(*(columns[key] for key in MATCHUP_COLUMNS))]
+    return saved_round["matchups"]
+
+
+def migrate_v1(data: dict):
+    """
+    Version 1 had no version number, and its matchups could lack notes,
+    or scores in files from before scores were saved.
+    """
+    rounds = data.get("rounds", [])
+    if not isinstance(rounds, list):
+        # left to `validate_session` to report
+        return
+    for saved_round in rounds:
+        if not isinstance(saved_round, dict) or not isinstance(saved_round.get("matchups"), list):
+            continue
+        for matchup in saved_round["matchups"]:
+            if not isinstance(matchup, dict):
+                continue
+            matchup.setdefault("notes", "")
+            if "score_player1" not in matchup and "score_player2" not in matchup:
+                winner = matchup.get("winner")
+                matchup["score_player1"] = 1.0 if winner and winner == matchup.get("player1") else 0.0
+                matchup["score_player2"] = 1.0 if winner and winner == matchup.get("player2") else 0.0
+
+
+# version -> what brings it to the next version
+SESSION_MIGRATIONS = {
+    1: migrate_v1,
+}
+
+
+def migrate_session(data: dict) -> dict:
+    """
+    Brings a session dict from an older version up to `SESSION_VERSION`, in place.
+    """
+    version = data.get("version", 1)
+    if not is_whole_number(version) or version < 1:
+        raise SessionError([f"version: should be a whole number of at least 1, not {version!r}"])
+    if version > SESSION_VERSION:
+        raise SessionError([f"Session version {version} is not supported, this app reads up to {SESSION_VERSION}"])
+    while version < SESSION_VERSION:
+        SESSION_MIGRATIONS[version](data)
+        version += 1
+    data["version"] = version
+    return data
+
+
+def matchup_rows(where: str, matchups: list, problems: list[str]):
+    """
+    The values of each matchup dict in `MATCHUP_COLUMNS` order, None for the broken ones.
+    """
+    get_values = operator.itemgetter(*MATCHUP_COLUMNS)
+    for row, matchup in enumerate(matchups, 1):
+        try:
+            yield get_values(matchup)
+        except (KeyError, TypeError):
+            if isinstance(matchup, dict):
+                missing = [key for key in MATCHUP_COLUMNS if key not in matchup]
+                problems.append(f"{where}.matchups[{row}]: missing {', '.join(missing)}")
+            else:
+                problems.append(f"{where}.matchups[{row}]: should be an object")
+            yield None
+
+
+def validate_session(data: dict) -> list[str]:
+    """
+    Everything wrong with a (migrated) session dict, in one pass over it.
+    Empty if it can be loaded.
+    """
+    problems = []
+    if not isinstance(data, dict):
+        return ["The session is not a JSON object"]
+
+    players = data.get("players", {})
+    if not isinstance(players, dict):
+        problems.append("players: should map names to whether they dropped")
+        players = {}
+    for name, dropped in players.items():
+        if not isinstance(dropped, bool):
+            problems.append(f"players.{name}: dropped should be true or false, not {dropped!r}")
+    settings = data.get("settings", {})
+    if not isinstance(settings, dict):
+        problems.append("settings: should be an object")
+        settings = {}
+    for key, (check, expected) in SETTING_CHECKS.items():
+        if key in settings and not check(settings[key]):
+            problems.append(f"settings.{key}: should be {expected}, not {settings[key]!r}")
+
+    rounds = data.get("rounds", [])
+    if not isinstance(rounds, list):
+        return problems + ["rounds: should be a list"]
+    special_winners = (None, "No Winner", "Delayed")
+    for round_number, saved_round in enumerate(rounds, 1):
+        where = f"rounds[{round_number}]"
+        if not isinstance(saved_round, dict):
+            problems.append(f"{where}: should be an object")
+            continue
+        if "columns" in saved_round:
+            columns = saved_round["columns"]
+            if not isinstance(columns, dict) or any(not isinstance(columns.get(key), list) for key in MATCHUP_COLUMNS):
+                problems.append(f"{where}.columns: should have the lists {', '.join(MATCHUP_COLUMNS)}")
+                continue
+            if len({len(columns[key]) for key in MATCHUP_COLUMNS}) > 1:
+                problems.append(f"{where}.columns: lists of different lengths")
+                continue
+            rows = zip(*(columns[key] for key in MATCHUP_COLUMNS))
+        elif isinstance(saved_round.get("matchups"), list):
+            rows = matchup_rows(where, saved_round["matchups"], problems)
+        else:
+            problems.append(f"{where}: has no matchups")
+            continue
+
+        for row, values in enumerate(rows, 1):
+            if values is None:
+                # already reported
+                continue
+            p1, p2, winner, score1, score2, notes = values
+            # checked before looking them up, a list can't be looked up in a dict
+            if not isinstance(p1, str):
+                problems.append(f"{where} matchup {row}: player1 should be a name, not {p1!r}")
+            elif p1 not in players:
+                problems.append(f"{where} matchup {row}: player1 {p1!r} is not a player")
+            # a BYE has no player2
+            if p2 is not None and not isinstance(p2, str):
+                problems.append(f"{where} matchup {row}: player2 should be a name, not {p2!r}")
+            elif p2 and p2 not in players:
+                problems.append(f"{where} matchup {row}: player2 {p2!r} is not a player")
+            if winner is not None and not isinstance(winner, str):
+                problems.append(f"{where} matchup {row}: winner should be a name, not {winner!r}")
+            elif winner and winner not in special_winners and winner != p1 and winner != p2:
+                problems.append(f"{where} matchup {row}: winner {winner!r} didn't play in it")
+            if not isinstance(score1, (int, float)) or not isinstance(score2, (int, float)):
+                problems.append(f"{where} matchup {row}: scores should be numbers, not {score1!r} and {score2!r}")
+            if not isinstance(notes, str):
+                problems.append(f"{where} matchup {row}: notes should be text, not {notes!r}")
+    return problems
+
+
+def session_from_dict(data: dict, metrics=None) -> tuple[list[Player], list[Round], dict]:
+    """
+    Rebuilds the players and rounds of a saved session, and returns them
+    with the saved settings (empty if there are none).
+
+    Older versions are migrated first, and the whole session is checked before anything
+    is built, raising a `SessionError` with all problems found. Pass `metrics`
+    (see `instrumentation.PairingMetrics`) to get the time of each step.
+    """
+    def span(name):
+        return metrics.span(name) if metrics is not None else nullcontext()
+
+    if not isinstance(data, dict):
+        raise SessionError(["The session is not a JSON object"])
+    with span("migrate"):
+        migrate_session(data)
+    with span("validate"):
+        problems = validate_session(data)
+    if problems:
+        raise SessionError(problems)
+
+    with span("build"):
+        # collecting garbage while creating this many objects that all stay alive only costs time
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            # share one string per name instead of one per matchup
+            names = {name: sys.intern(name) for name in data.get("players", {})}
+            names[None] = None
+            players = [Player(names[name], dropped=dropped) for name, dropped in data.get("players", {}).items()]
+
+            rounds = []
+            for saved_round in data.get("rounds", []):
+                if "columns" in saved_round:
+                    # from a binary file, no dict per matchup
+                    columns = saved_round["columns"]
+                    rows = zip(*(columns[key] for key in MATCHUP_COLUMNS))
+                else:
+                    rows = ((m["player1"], m["player2"], m["winner"], m["score_player1"], m["score_player2"], m["notes"])
+                            for m in saved_round["matchups"])
+                matchups = []
+                for p1, p2, winner, score1, score2, notes in rows:
+                    matchup = Matchup(names[p1], names[p2 or None], notes)
+                    matchup.score_player1 = score1
+                    matchup.score_player2 = score2
+                    matchup.winner = names.get(winner, winner) or None
+                    matchups.append(matchup)
+                rounds.append(Round(matchups))
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    if metrics is not None:
+        metrics.count("players", len(players))
+        metrics.count("matchups", sum(len(r.matchups) for r in rounds))
+    return players, rounds, data.get("settings", {})
+
+
+BINARY_EXTENSION = ".swiss"
+BINARY_MAGIC = b"SWSB"
+BINARY_VERSION = 1
+# winner codes of the binary format, 1 and 2 are player1 and player2
+NO_RESULT, PLAYER1_WON, PLAYER2_WON, NO_WINNER, DELAYED = range(5)
+SPECIAL_WINNERS = {"No Winner": NO_WINNER, "Delayed": DELAYED}
+
+
+def is_binary_session_file(file_name: str) -> bool:
+    return file_name.lower().endswith(BINARY_EXTENSION)
+
+
+def read_session_file(file_name: str) -> dict:
+    with open(file_name, "rb") as f:
+        contents = f.read()
+    if contents.startswith(BINARY_MAGIC):
+        return session_from_binary(contents)
+    return json.loads(contents.decode("utf-8-sig"))
+
+
+def write_session_file(file_name: str, data: dict):
+    if is_binary_session_file(file_name):
+        with open(file_name, "wb") as f:
+            f.write(session_to_binary(data))
+        return
+    with open(file_name, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+
+
+def pack_array(values: array) -> bytes:
+    # always little endian on disk
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def unpack_array(typecode: str, contents: bytes, offset: int, count: int) -> tuple[array, int]:
+    values = array(typecode)
+    end = offset + count * values.itemsize
+    values.frombytes(contents[offset:end])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, end
+
+
+def pack_blob(blob: bytes) -> bytes:
+    return struct.pack("<I", len(blob)) + blob
+
+
+def unpack_blob(contents: bytes, offset: int) -> tuple[bytes, int]:
+    (length,) = struct.unpack_from("<I", contents, offset)
+    offset += 4
+    return contents[offset:offset + length], offset + length
+
+
+def session_to_binary(data: dict) -> bytes:
+    """
+    Packs a session dict into the binary format:
+    magic and version, then everything besides players and rounds (settings, metrics) as JSON,
+    the player names once, their dropped flags, and per round the columns player1 and player2
+    (indices into the names, -1 for a BYE), winner codes, both scores and the non-empty notes.
+    """
+    names = list(data.get("players", {}))
+    ids = {name: i for i, name in enumerate(names)}
+    if any("\0" in name for name in names):
+        raise ValueError("Player names can't contain null characters")
+    extra = {key: value for key, value in data.items() if key not in ("players", "rounds")}
+
+    parts = [BINARY_MAGIC, struct.pack("<H", BINARY_VERSION),
+             pack_blob(json.dumps(extra, ensure_ascii=False).encode("utf-8")),
+             struct.pack("<I", len(names)),
+             pack_blob("\0".join(names).encode("utf-8")),
+             pack_array(array("b", [bool(dropped) for dropped in data.get("players", {}).values()])),
+             struct.pack("<I", len(data.get("rounds", [])))]
+
+    for saved_round in data.get("rounds", []):
+        matchups = round_matchup_dicts(saved_round)
+        player1 = array("i")
+        player2 = array("i")
+        winners = array("b")
+        score1 = array("d")
+        score2 = array("d")
+        notes = {}
+        for row, matchup in enumerate(matchups):
+            player1.append(ids[matchup["player1"]])
+            player2.append(ids[matchup["player2"]] if matchup["player2"] else -1)
+            winner = matchup["winner"]
+            if not winner:
+                winners.append(NO_RESULT)
+            elif winner == matchup["player1"]:
+                winners.append(PLAYER1_WON)
+            elif winner == matchup["player2"]:
+                winners.append(PLAYER2_WON)
+            elif winner in SPECIAL_WINNERS:
+                winners.append(SPECIAL_WINNERS[winner])
+            else:
+                raise ValueError(f"Unknown winner {winner} of {matchup['player1']} - {matchup['player2']}")
+            score1.append(matchup["score_player1"])
+            score2.append(matchup["score_player2"])
+            if matchup.get("notes"):
+                notes[row] = matchup["notes"]
+        parts += [struct.pack("<I", len(matchups)), pack_array(player1), pack_array(player2), pack_array(winners),
+                  pack_array(score1), pack_array(score2), pack_blob(json.dumps(notes, ensure_ascii=False).encode("utf-8"))]
+    return b"".join(parts)
+
+
+def session_from_binary(contents: bytes) -> dict:
+    """
+    The session dict of a file written by `session_to_binary`, with the rounds as columns.
+    """
+    if not contents.startswith(BINARY_MAGIC):
+        raise ValueError("Not a binary session file")
+    offset = len(BINARY_MAGIC)
+    (version,) = struct.unpack_from("<H", contents, offset)
+    offset += 2
+    if version > BINARY_VERSION:
+        raise ValueError(f"Binary session version {version} is newer than this app supports ({BINARY_VERSION})")
+
+    extra, offset = unpack_blob(contents, offset)
+    data = json.loads(extra.decode("utf-8"))
+    (n_players,) = struct.unpack_from("<I", contents, offset)
+    offset += 4
+    names, offset = unpack_blob(contents, offset)
+    names = [sys.intern(name) for name in names.decode("utf-8").split("\0")] if n_players else []
+    dropped, offset = unpack_array("b", contents, offset, n_players)
+    data["players"] = dict(zip(names, map(bool, dropped)))
+
+    (n_rounds,) = struct.unpack_from("<I", contents, offset)
+    offset += 4
+    rounds = []
+    for _ in range(n_rounds):
+        (n_matchups,) = struct.unpack_from("<I", contents, offset)
+        offset += 4
+        player1, offset = unpack_array("i", contents, offset, n_matchups)
+        player2, offset = unpack_array("i", contents, offset, n_matchups)
+        winners, offset = unpack_array("b", contents, offset, n_matchups)
+        score1, offset = unpack_array("d", contents, offset, n_matchups)
+        score2, offset = unpack_array("d", contents, offset, n_matchups)
+        notes, offset = unpack_blob(contents, offset)
+        notes = {int(row): note for row, note in json.loads(notes.decode("utf-8")).items()}
+
+        player1 = [names[p1] for p1 in player1]
+        player2 = [names[p2] if p2 >= 0 else None for p2 in player2]
+        winners = [(None, p1, p2, "No Winner", "Delayed")[winner] for p1, p2, winner in zip(player1, player2, winners)]
+        rounds.append({"columns": {
+            "player1": player1,
+            "player2": player2,
+            "winner": winners,
+            "score_player1": score1.tolist(),
+            "score_player2": score2.tolist(),
+            "notes": [notes.get(row, "") for row in range(n_matchups)] if notes else [""] * n_matchups,
+        }})
+    data["rounds"] = rounds
+    return data
+
+
+def replace_session_file(file_name: str, data: dict):
+    """
+    Like `write_session_file`, but through a temp file that replaces the old one when it's
+    complete, so a crash while writing leaves the previous version intact.
+    """
+    directory = os.path.dirname(os.path.abspath(file_name))
+    fd, temp_file = tempfile.mkstemp(prefix=os.path.basename(file_name) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if is_binary_session_file(file_name):
+                f.write(session_to_binary(data))
+            else:
+                f.write(json.dumps(data, indent=4, ensure_ascii=False).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, file_name)
+    except BaseException:
+        os.remove(temp_file)
+        raise
@@ -8,6 +8,7 @@ from PySide6.QtWidgets import *
 from PySide6 import QtWidgets
 from ui_swiss import *
 from classes import *
+from pairing import MATCHING_BACKEND_NAMES
 import json
 
 class SettingsDialog(QDialog):
@@ -15,6 +16,13 @@ class SettingsDialog(QDialog):
     p2_ext_point = 0.0
     random_ext_point_assignment = True
     selected_clipboard_format = 1
+    pairing_window = 2
+    matching_backend = "networkx"
+    profile_pairing = False
+    pairing_seeds = 1
+    pairing_deadline = 0.0
+    pairing_block_size = 0
+    round_tables_kept = 0
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -47,11 +55,38 @@ class SettingsDialog(QDialog):
         if button:
             button.setChecked(True)
 
+        self.pairing_window = settings.get('pairing_window', self.pairing_window)
+        self.window_spinbox.setValue(self.pairing_window)
+
+        self.matching_backend = settings.get('matching_backend', self.matching_backend)
+        self.backend_combobox.setCurrentText(self.matching_backend)
+
+        self.profile_pairing = settings.get('profile_pairing', self.profile_pairing)
+        self.profile_checkbox.setChecked(self.profile_pairing)
+
+        self.pairing_seeds = settings.get('pairing_seeds', self.pairing_seeds)
+        self.seeds_spinbox.setValue(self.pairing_seeds)
+
+        self.pairing_deadline = settings.get('pairing_deadline', self.pairing_deadline)
+        self.deadline_spinbox.setValue(self.pairing_deadline)
+
+        self.pairing_block_size = settings.get('pairing_block_size', self.pairing_block_size)
+        self.block_size_spinbox.setValue(self.pairing_block_size)
+
+        self.round_tables_kept = settings.get('round_tables_kept', self.round_tables_kept)
+        self.round_tables_spinbox.setValue(self.round_tables_kept)
 
         print(f"""Saved the following settings:
 Player 1: {self.p1_ext_point}, Player 2: {self.p2_ext_point}
 Randomly assigned: {self.random_ext_point_assignment}
-Clipboard format: {self.selected_clipboard_format}""")
+Clipboard format: {self.selected_clipboard_format}
+Pairing window: {self.pairing_window}
+Matching backend: {self.matching_backend}
+Profile pairing: {self.profile_pairing}
+Pairing seeds: {self.pairing_seeds}
+Pairing deadline: {self.pairing_deadline}
+Pairing block size: {self.pairing_block_size}
+Round tables kept: {self.round_tables_kept}""")
 
 
     def build_ui(self):
@@ -126,6 +161,68 @@ Clipboard format: {self.selected_clipboard_format}""")
         fmt_group.setLayout(fmt_layout)
         layout.addWidget(fmt_group)
 
+        # --- Pairing ---
+        pairing_group = QGroupBox("Pairing")
+        pairing_layout = QFormLayout()
+        pairing_layout.setSpacing(8)
+
+        # how many score levels apart players can be to still be considered
+        # as opponents in the matching, widened automatically if needed
+        self.window_spinbox = QSpinBox()
+        self.window_spinbox.setRange(1, 100)
+        self.window_spinbox.setValue(self.pairing_window)
+        pairing_layout.addRow("Score group window:", self.window_spinbox)
+
+        # all backends give equally good pairings, but their speed differs per event size
+        self.backend_combobox = QComboBox()
+        self.backend_combobox.addItems(MATCHING_BACKEND_NAMES)
+        self.backend_combobox.setCurrentText(self.matching_backend)
+        pairing_layout.addRow("Matching backend:", self.backend_combobox)
+
+        # tries other delay coin flips on other cores and keeps the best pairing
+        self.seeds_spinbox = QSpinBox()
+        self.seeds_spinbox.setRange(1, 64)
+        self.seeds_spinbox.setValue(self.pairing_seeds)
+        pairing_layout.addRow("Pairing seeds:", self.seeds_spinbox)
+
+        # for big events, gives the best pairing found in time instead of waiting for the optimal one
+        self.deadline_spinbox = QDoubleSpinBox()
+        self.deadline_spinbox.setRange(0, 3600)
+        self.deadline_spinbox.setSuffix(" s")
+        self.deadline_spinbox.setSpecialValueText("No limit")
+        self.deadline_spinbox.setValue(self.pairing_deadline)
+        pairing_layout.addRow("Pairing deadline:", self.deadline_spinbox)
+
+        # splits big events into score blocks that are matched separately on all cores
+        self.block_size_spinbox = QSpinBox()
+        self.block_size_spinbox.setRange(0, 100000)
+        self.block_size_spinbox.setSpecialValueText("Off")
+        self.block_size_spinbox.setValue(self.pairing_block_size)
+        pairing_layout.addRow("Score block size:", self.block_size_spinbox)
+
+        # slows round generation down, only for finding out why a round was slow
+        self.profile_checkbox = QCheckBox("Profile round generation")
+        self.profile_checkbox.setChecked(self.profile_pairing)
+        pairing_layout.addRow(self.profile_checkbox)
+
+        pairing_group.setLayout(pairing_layout)
+        layout.addWidget(pairing_group)
+
+        # --- Display ---
+        display_group = QGroupBox("Display")
+        display_layout = QFormLayout()
+        display_layout.setSpacing(8)
+
+        # for long events, frees the tables of rounds that weren't looked at in a while
+        self.round_tables_spinbox = QSpinBox()
+        self.round_tables_spinbox.setRange(0, 1000)
+        self.round_tables_spinbox.setSpecialValueText("All")
+        self.round_tables_spinbox.setValue(self.round_tables_kept)
+        display_layout.addRow("Round tables kept open:", self.round_tables_spinbox)
+
+        display_group.setLayout(display_layout)
+        layout.addWidget(display_group)
+
         btn_layout = QHBoxLayout()
         btn_layout.addStretch()
 
@@ -145,6 +242,13 @@ Clipboard format: {self.selected_clipboard_format}""")
         self.p1_ext_point = self.p1_spinbox.value()
         self.p2_ext_point = self.p2_spinbox.value()
         self.random_ext_point_assignment = self.random_assignment_checkbox.isChecked()
+        self.pairing_window = self.window_spinbox.value()
+        self.matching_backend = self.backend_combobox.currentText()
+        self.profile_pairing = self.profile_checkbox.isChecked()
+        self.pairing_seeds = self.seeds_spinbox.value()
+        self.pairing_deadline = self.deadline_spinbox.value()
+        self.pairing_block_size = self.block_size_spinbox.value()
+        self.round_tables_kept = self.round_tables_spinbox.value()
 
         # TODO: create actual formats
         self.selected_clipboard_format = self.fmt_button_group.checkedId()
@@ -153,7 +257,14 @@ Clipboard format: {self.selected_clipboard_format}""")
         print(f"""Saved the following settings:
 Player 1: {self.p1_ext_point}, Player 2: {self.p2_ext_point}
 Randomly assigned: {self.random_ext_point_assignment}
-Clipboard format: {self.selected_clipboard_format}: {format_names[self.selected_clipboard_format]}""")
+Clipboard format: {self.selected_clipboard_format}: {format_names[self.selected_clipboard_format]}
+Pairing window: {self.pairing_window}
+Matching backend: {self.matching_backend}
+Profile pairing: {self.profile_pairing}
+Pairing seeds: {self.pairing_seeds}
+Pairing deadline: {self.pairing_deadline}
+Pairing block size: {self.pairing_block_size}
+Round tables kept: {self.round_tables_kept}""")
 
         self.accept()
 
@@ -0,0 +1,205 @@
+import numpy as np
+from classes import *
+
+
+class RoundIndex():
+    """
+    A round's matchups as arrays of player indices, plus the results
+    as they were last counted in the snapshots.
+    """
+    def __init__(self, round: Round, player_index: dict[str, int], n_players: int):
+        self.round = round
+        matchups = round.matchups
+        self.rows = {id(m): i for i, m in enumerate(matchups)}
+        self.p1 = np.fromiter((player_index[m.player1] for m in matchups), dtype=np.int64, count=len(matchups))
+        self.p2 = np.fromiter((player_index[m.player2] if m.player2 else -1 for m in matchups), dtype=np.int64, count=len(matchups))
+        self.has_p2 = self.p2 >= 0
+        # row of every player in this round, -1 if not in it
+        self.position = np.full(n_players, -1, dtype=np.int64)
+        self.position[self.p2[self.has_p2]] = np.nonzero(self.has_p2)[0]
+        self.position[self.p1] = np.arange(len(matchups))
+        self.read_results()
+        self.mispaired = np.zeros(len(matchups), dtype=bool)
+
+    def read_results(self):
+        matchups = self.round.matchups
+        count = len(matchups)
+        self.score1 = np.fromiter((m.score_player1 for m in matchups), dtype=np.float64, count=count)
+        self.score2 = np.fromiter((m.score_player2 for m in matchups), dtype=np.float64, count=count)
+        self.win1 = np.fromiter((m.winner == m.player1 for m in matchups), dtype=np.int64, count=count)
+        self.win2 = np.fromiter((bool(m.player2) and m.winner == m.player2 for m in matchups), dtype=np.int64, count=count)
+        self.delayed = np.fromiter((m.winner == "Delayed" for m in matchups), dtype=np.int64, count=count)
+
+
+class StatsSnapshot():
+    """
+    Cumulative stats of every player after some number of rounds, by player index.
+    """
+    STATS = ("score", "n_played", "n_wins", "active_delays", "mispairings")
+
+    def __init__(self, n_players: int):
+        self.score = np.zeros(n_players, dtype=np.float64)
+        self.n_played = np.zeros(n_players, dtype=np.int64)
+        self.n_wins = np.zeros(n_players, dtype=np.int64)
+        self.active_delays = np.zeros(n_players, dtype=np.int64)
+        self.mispairings = np.zeros(n_players, dtype=np.int64)
+
+    def copy(self):
+        snapshot = StatsSnapshot(0)
+        for stat in self.STATS:
+            setattr(snapshot, stat, getattr(self, stat).copy())
+        return snapshot
+
+
+class StatsEngine():
+    """
+    Keeps a snapshot of everyone's cumulative stats after every round,
+    so the stats as of any round are there without replaying the history.
+
+    New rounds are counted the first time they're asked for. When a result changes,
+    `update_matchup` patches only the two players involved in the later snapshots
+    (and the mispairings their new scores cause or undo in later rounds).
+    Resistance depends on the opponents' scores at that time, so it's
+    calculated per round when asked for and cached until a result changes.
+    """
+    def __init__(self, players: list[Player], rounds: list[Round]):
+        self.reset(players, rounds)
+
+    def reset(self, players: list[Player], rounds: list[Round]):
+        self.players = players
+        self.rounds = rounds
+        self.player_index = {player.name: i for i, player in enumerate(players)}
+        self.round_indices: list[RoundIndex] = []
+        self.snapshots: list[StatsSnapshot] = [StatsSnapshot(len(players))]
+        self.resistances: dict[int, np.ndarray] = {}
+
+    def get_stats(self, n_rounds: int | None = None, as_dict: bool = False) -> list[PlayerInfo] | dict[str, PlayerInfo]:
+        """
+        Same as `calculate_players_stats` over the first `n_rounds` rounds (all by default).
+        """
+        if n_rounds is None:
+            n_rounds = len(self.rounds)
+        self.catch_up(n_rounds)
+        snapshot = self.snapshots[n_rounds]
+        resistance = self.get_resistance(n_rounds)
+
+        player_info_dict: dict[str, PlayerInfo] = {}
+        score = snapshot.score.tolist()
+        n_played = snapshot.n_played.tolist()
+        n_wins = snapshot.n_wins.tolist()
+        active_delays = snapshot.active_delays.tolist()
+        mispairings = snapshot.mispairings.tolist()
+        resistance = resistance.tolist()
+        for i, player in enumerate(self.players):
+            player_info = PlayerInfo(player)
+            player_info.score = score[i]
+            player_info.resistance = resistance[i]
+            player_info.n_played = n_played[i]
+            player_info.n_wins = n_wins[i]
+            player_info.active_delays = active_delays[i]
+            player_info.mispairings = mispairings[i]
+            player_info_dict[player.name] = player_info
+
+        if as_dict:
+            return player_info_dict
+        return list(player_info_dict.values())
+
+    def catch_up(self, n_rounds: int):
+        """
+        Makes sure there's a snapshot for every round up to `n_rounds`.
+        """
+        if len(self.player_index) != len(self.players):
+            # players were added, start over
+            self.reset(self.players, self.rounds)
+
+        while len(self.snapshots) <= n_rounds:
+            round_number = len(self.snapshots) - 1
+            round_index = RoundIndex(self.rounds[round_number], self.player_index, len(self.players))
+            self.round_indices.append(round_index)
+            self.snapshots.append(self.apply_round(self.snapshots[-1], round_index))
+
+    def apply_round(self, snapshot: StatsSnapshot, round_index: RoundIndex) -> StatsSnapshot:
+        new_snapshot = snapshot.copy()
+        p1 = round_index.p1
+        has_p2 = round_index.has_p2
+        p2 = round_index.p2[has_p2]
+
+        # mispairings are decided on the scores before the round
+        round_index.mispaired[:] = False
+        round_index.mispaired[has_p2] = snapshot.score[p1[has_p2]] != snapshot.score[p2]
+        mispaired = round_index.mispaired
+        np.add.at(new_snapshot.mispairings, p1[mispaired], 1)
+        np.add.at(new_snapshot.mispairings, round_index.p2[mispaired], 1)
+
+        np.add.at(new_snapshot.score, p1, round_index.score1)
+        np.add.at(new_snapshot.score, p2, round_index.score2[has_p2])
+        np.add.at(new_snapshot.n_played, p1, 1)
+        np.add.at(new_snapshot.n_played, p2, 1)
+        np.add.at(new_snapshot.n_wins, p1, round_index.win1)
+        np.add.at(new_snapshot.n_wins, p2, round_index.win2[has_p2])
+        np.add.at(new_snapshot.active_delays, p1, round_index.delayed)
+        np.add.at(new_snapshot.active_delays, p2, round_index.delayed[has_p2])
+        return new_snapshot
+
+    def get_resistance(self, n_rounds: int) -> np.ndarray:
+        if n_rounds not in self.resistances:
+            score = self.snapshots[n_rounds].score
+            resistance = np.zeros(len(self.players), dtype=np.float64)
+            for round_index in self.round_indices[:n_rounds]:
+                has_p2 = round_index.has_p2
+                p1 = round_index.p1[has_p2]
+                p2 = round_index.p2[has_p2]
+                # add opponent's score to resistance
+                np.add.at(resistance, p1, score[p2])
+                np.add.at(resistance, p2, score[p1])
+            self.resistances[n_rounds] = resistance
+        return self.resistances[n_rounds]
+
+    def update_matchup(self, round_number: int, matchup: Matchup):
+        """
+        Call after the winner or scores of a matchup in round `round_number` (0-based) changed.
+        """
+        if round_number >= len(self.round_indices):
+            # not counted yet, will be read when it is
+            return
+        round_index = self.round_indices[round_number]
+        row = round_index.rows[id(matchup)]
+        old = (round_index.score1[row], round_index.score2[row], round_index.win1[row],
+               round_index.win2[row], round_index.delayed[row])
+        round_index.score1[row] = matchup.score_player1
+        round_index.score2[row] = matchup.score_player2
+        round_index.win1[row] = matchup.winner == matchup.player1
+        round_index.win2[row] = bool(matchup.player2) and matchup.winner == matchup.player2
+        round_index.delayed[row] = matchup.winner == "Delayed"
+        new = (round_index.score1[row], round_index.score2[row], round_index.win1[row],
+               round_index.win2[row], round_index.delayed[row])
+        if old == new:
+            return
+
+        players = [(int(round_index.p1[row]), new[0] - old[0], new[2] - old[2])]
+        if round_index.has_p2[row]:
+            players.append((int(round_index.p2[row]), new[1] - old[1], new[3] - old[3]))
+        delay_change = new[4] - old[4]
+        later = self.snapshots[round_number + 1:]
+        for player, score_change, win_change in players:
+            for snapshot in later:
+                snapshot.score[player] += score_change
+                snapshot.n_wins[player] += win_change
+                snapshot.active_delays[player] += delay_change
+
+        # the new scores may change which of their later matchups were mispairings
+        for later_round in range(round_number + 1, len(self.round_indices)):
+            later_index = self.round_indices[later_round]
+            scores = self.snapshots[later_round].score
+            rows = {int(later_index.position[player]) for player, _, _ in players} - {-1}
+            for later_row in rows:
+                if not later_index.has_p2[later_row]:
+                    continue
+                p1, p2 = later_index.p1[later_row], later_index.p2[later_row]
+                mispaired = scores[p1] != scores[p2]
+                if mispaired == later_index.mispaired[later_row]:
+                    continue
+                later_index.mispaired[later_row] = mispaired
+                for snapshot in self.snapshots[later_round + 1:]:
+                    snapshot.mispairings[[p1, p2]] += 1 if mispaired else -1
+        self.resistances.clear()
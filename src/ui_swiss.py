@@ -75,9 +75,9 @@ class Ui_MainWindow(object):
         self.tabWidget.addTab(self.settings, "")
         self.players = QWidget()
         self.players.setObjectName(u"players")
-        self.playersTableWidget = QTableWidget(self.players)
-        self.playersTableWidget.setObjectName(u"playersTableWidget")
-        self.playersTableWidget.setGeometry(QRect(10, 20, 771, 511))
+        self.playersTableView = QTableView(self.players)
+        self.playersTableView.setObjectName(u"playersTableView")
+        self.playersTableView.setGeometry(QRect(10, 20, 771, 511))
         self.tabWidget.addTab(self.players, "")
         self.logs = QWidget()
         self.logs.setObjectName(u"logs")
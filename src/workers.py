@@ -0,0 +1,60 @@
+from PySide6.QtCore import QObject, Signal
+import traceback
+from classes import *
+from instrumentation import PairingMetrics
+from pairing import PairingSettings, generate_matchups
+
+
+class RoundGenerationWorker(QObject):
+    """
+    Generates the next round in a background thread so the window stays responsive.
+
+    Works on a snapshot of the session taken when it's created, so edits made in the
+    window in the meantime can't end up halfway into the pairing. The snapshot is only
+    names and results in tuples, which is quick to take on the UI thread, the players,
+    rounds and opponent history are rebuilt from it in the background.
+    The pairing itself can't be interrupted, cancelling only means the result is dropped.
+    """
+    # worker, matchups, metrics
+    finished = Signal(object, object, object)
+    # worker, error message
+    failed = Signal(object, str)
+    # always emitted at the end, to stop the thread
+    done = Signal()
+
+    def __init__(self, players: list[Player], rounds: list[Round], settings, metrics: PairingMetrics):
+        super().__init__()
+        self.players = [(player.name, player.dropped) for player in players]
+        self.rounds = [[(m.player1, m.player2, m.winner, m.score_player1, m.score_player2) for m in round.matchups]
+                       for round in rounds]
+        self.settings = PairingSettings.from_settings(settings)
+        self.metrics = metrics
+        self.round_number = len(rounds) + 1
+        self.cancelled = False
+
+    def rebuild(self) -> tuple[list[Player], list[Round]]:
+        players = [Player(name, dropped) for name, dropped in self.players]
+        rounds = []
+        for saved_round in self.rounds:
+            matchups = []
+            for player1, player2, winner, score_player1, score_player2 in saved_round:
+                matchup = Matchup(player1, player2)
+                matchup.winner = winner
+                matchup.score_player1 = score_player1
+                matchup.score_player2 = score_player2
+                matchups.append(matchup)
+            rounds.append(Round(matchups))
+        return players, rounds
+
+    def run(self):
+        try:
+            players, rounds = self.rebuild()
+            matchups = generate_matchups(players, rounds, self.settings, OpponentHistory(rounds), metrics=self.metrics)
+            if not self.cancelled:
+                self.finished.emit(self, matchups, self.metrics)
+        except Exception as e:
+            traceback.print_exc()
+            if not self.cancelled:
+                self.failed.emit(self, str(e))
+        finally:
+            self.done.emit()